@@ -3,6 +3,18 @@ ASGI config for DIYblog project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Under ASGI the homepage, the blog list, the blog detail page and the
+blogs-by-blogger page are served by the async views in
+blog/async_views.py (DIYblog/settings_asgi.py points ROOT_URLCONF at
+DIYblog/asgi_urls.py); the rest of the site runs the sync views in a
+thread pool as usual. To serve it with any ASGI server, e.g.:
+
+    pip install uvicorn
+    uvicorn DIYblog.asgi:application --workers 4
+
+`python manage.py bench_interfaces` compares the throughput of this
+entry point with DIYblog/wsgi.py under concurrent connections.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -11,6 +23,7 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DIYblog.settings')
+# DIYblog.settings, with the read paths routed to the async views
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DIYblog.settings_asgi')
 
 application = get_asgi_application()
@@ -0,0 +1,15 @@
+"""
+URL configuration used by the ASGI entry point (DIYblog/asgi.py).
+
+The same as DIYblog/urls.py, except that the read-heavy blog pages are
+served by the async views in blog/async_views.py. Patterns are matched
+in order, so these shadow their sync twins; both share the same names
+and paths, so reverse() gives the same URLs either way.
+"""
+from django.urls import path, include
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('blog/', include('blog.async_urls')),
+] + sync_urlpatterns
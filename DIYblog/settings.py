@@ -45,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover everything below
+    'blog.middleware.PerformanceMiddleware',
+    # before sessions, so that session writes pin the visitor too
+    'blog.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,11 +58,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# DIYblog/settings_asgi.py switches this to DIYblog.asgi_urls for the async views
 ROOT_URLCONF = 'DIYblog.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # the standard Django backend, timed for the Server-Timing header
+        'BACKEND': 'blog.metrics.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,6 +99,38 @@ DATABASES = {
 # },
 }
 
+# Read replicas of 'default', as {alias: weight}. Reads from the views
+# are spread over them and everything else goes to 'default' (see
+# blog/routers.py). To try it locally with two SQLite files, copy
+# db.sqlite3 and point SQLITE_REPLICA at the copy.
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = {}
+# how long, in seconds, a visitor keeps reading from 'default' after a write
+REPLICA_PIN_SECONDS = 10
+
+if config("SQLITE_REPLICA", default=""):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': config("SQLITE_REPLICA"),
+        # tests read the replica through the test copy of 'default'
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = {'replica': 1}
+
+# Pragmas run on every new SQLite connection (see blog/sqlite.py).
+# WAL keeps readers going while a comment is written, synchronous=NORMAL
+# stays crash-safe in WAL mode without an fsync per commit, busy_timeout
+# (milliseconds) makes writers queue for the lock instead of erroring.
+# Set SQLITE_PRODUCTION=False in the environment for SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # negative means KiB, so about 20MB
+    'temp_store': 'MEMORY',
+} if config("SQLITE_PRODUCTION", default=True, cast=bool) else {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
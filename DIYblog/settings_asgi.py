@@ -0,0 +1,10 @@
+"""
+Django settings for the ASGI entry point (DIYblog/asgi.py).
+
+The same as DIYblog/settings.py, except that the read pages are routed
+to the async views by DIYblog/asgi_urls.py.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'DIYblog.asgi_urls'
@@ -0,0 +1,75 @@
+'''per-blog comment counts and last activity, kept on the Blog row
+
+The blog lists show how many comments each post has and when the last
+one was written. Counting and MAX()ing the comments of every listed blog
+on each page view would cost a join per page, so Blog carries
+comment_count and last_comment_at instead. The comment views adjust them
+with F() expressions in the same transaction as the comment itself, and
+reconcile() recomputes them from the comments table to repair drift
+from writes that went around the views (the admin, bulk imports).
+'''
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import page_cache
+from .models import Blog, Comments
+
+
+def _changed(*blogger_ids):
+    '''the listings show these columns, so their cached pages are stale'''
+    page_cache.bump(page_cache.LIST, *(page_cache.blogger_version(pk) for pk in blogger_ids))
+
+
+def comment_added(comment):
+    '''call in the transaction that saved a new, live comment or restored one'''
+    when = Value(comment.date_of_comment)
+    Blog.all_objects.filter(pk=comment.blog_id).update(
+        comment_count=F('comment_count') + 1,
+        # comments committed out of order must not move it backwards
+        last_comment_at=Greatest(Coalesce('last_comment_at', when), when))
+    _changed(comment.blog.blogger_id)
+
+
+def comment_removed(comment):
+    '''call in the transaction that deleted or soft-deleted a live comment'''
+    latest = Comments.objects.filter(blog=OuterRef('pk')).order_by(
+        '-date_of_comment').values('date_of_comment')[:1]
+    Blog.all_objects.filter(pk=comment.blog_id).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=Subquery(latest))
+    _changed(comment.blog.blogger_id)
+
+
+def reconcile(chunk_size=1000):
+    '''
+    Recompute every blog's columns from its live comments, one chunk of
+    blogs at a time, and return how many blogs had drifted.
+    '''
+    fixed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            blogs = list(Blog.all_objects.filter(pk__gt=last_id).order_by('pk').values_list(
+                'pk', 'blogger_id', 'comment_count', 'last_comment_at')[:chunk_size])
+            if not blogs:
+                return fixed
+            last_id = blogs[-1][0]
+
+            actual = {
+                row['blog_id']: (row['count'], row['last'])
+                for row in Comments.objects.filter(blog_id__in=[blog[0] for blog in blogs])
+                .values('blog_id').annotate(count=Count('pk'), last=Max('date_of_comment'))
+                .order_by()}
+            drifted = []
+            bloggers = set()
+            for pk, blogger_id, count, last in blogs:
+                expected = actual.get(pk, (0, None))
+                if expected != (count, last):
+                    drifted.append(Blog(pk=pk, comment_count=expected[0],
+                                        last_comment_at=expected[1]))
+                    bloggers.add(blogger_id)
+            if drifted:
+                Blog.all_objects.bulk_update(drifted, ['comment_count', 'last_comment_at'])
+                _changed(*bloggers)
+                fixed += len(drifted)
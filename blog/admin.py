@@ -1,14 +1,72 @@
 from django.contrib import admin
-from .models import Blog, Blogger, Comments
+from . import approvals, search
+from .pagination import EstimatedCountPaginator
+from .models import Blog, Blogger, Comments, OutboxEmail, RequestToBeBlogger
 
 # Register your models here.
 
+class AllObjectsMixin:
+    '''lists soft-deleted rows too, through the model's all_objects manager'''
+    # the tables behind these grow without bound, so the changelist
+    # doesn't count them exactly (see EstimatedCountPaginator), and
+    # sorts by the primary key so a page is read straight off it
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+
+    actions = ['soft_delete_selected', 'restore_selected']
+
+    def get_queryset(self, request):
+        qs = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            qs = qs.order_by(*ordering)
+        return qs
+
+    # the flags only change through the model's soft_delete() and
+    # restore(), which keep deleted_at and the counters in step
+    def get_readonly_fields(self, request, obj=None):
+        deleted_field = self.model.objects.deleted_field
+        return (*super().get_readonly_fields(request, obj), deleted_field, 'deleted_at')
+
+    @admin.action(description='Soft-delete selected %(verbose_name_plural)s',
+                  permissions=['change'])
+    def soft_delete_selected(self, request, queryset):
+        count = sum(obj.soft_delete() for obj in queryset)
+        self.message_user(request, f'Soft-deleted {count} row(s).')
+
+    @admin.action(description='Restore selected %(verbose_name_plural)s',
+                  permissions=['change'])
+    def restore_selected(self, request, queryset):
+        count = sum(obj.restore() for obj in queryset)
+        self.message_user(request, f'Restored {count} row(s).')
+
+
 # defining the admin class
 
 
-class BlogAdmin(admin.ModelAdmin):
-    list_display = ('name', 'blogger', 'time_of_upload')
-    list_filter = ('date_uploaded', 'time_of_upload')
+class BlogAdmin(AllObjectsMixin, admin.ModelAdmin):
+    list_display = ('name', 'blogger', 'time_of_upload', 'is_deleted')
+    list_select_related = ('blogger',)
+    # time_of_upload has an index of its own covering deleted blogs too;
+    # date_uploaded is neither indexed nor in step with the id
+    list_filter = ('is_deleted', 'time_of_upload')
+    autocomplete_fields = ('blogger',)
+    search_fields = ('name',)
+    search_help_text = 'Words in the title or text of live blogs, or a blog id.'
+
+    def get_search_results(self, request, queryset, search_term):
+        # the full-text index rather than a LIKE scan over every description
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return queryset.filter(search.matching(search_term)), False
+
+    def save_model(self, request, obj, form, change):
+        obj.render_description('description' in form.changed_data)
+        super().save_model(request, obj, form, change)
 
 
 # registering the admin class with the associated model
@@ -20,9 +78,80 @@ admin.site.register(Blog, BlogAdmin)
 class BloggerAdmin(admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'user',
                     'date_of_birth', 'date_joined', 'bio')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    # a search would otherwise count the whole table for "x of N"
+    show_full_result_count = False
+    # also what the blog form's autocomplete searches
+    search_fields = ('last_name', 'first_name')
 
 
 # registering the admin class with the associated model
 admin.site.register(Blogger, BloggerAdmin)
 
-admin.site.register(Comments)
\ No newline at end of file
+# defining the admin class
+
+
+class CommentsAdmin(AllObjectsMixin, admin.ModelAdmin):
+    list_display = ('__str__', 'username', 'blog', 'date_of_comment', 'deleted')
+    list_select_related = ('username', 'blog')
+    list_filter = ('deleted',)
+    # the blogs and users are far too many for a <select>
+    raw_id_fields = ('username', 'blog')
+    search_fields = ('username__username',)
+    search_help_text = 'A blog id, or the exact username of the commenter.'
+
+    def get_search_results(self, request, queryset, search_term):
+        # lookups that use the foreign key indexes instead of a LIKE scan
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(blog_id=int(search_term)), False
+        return queryset.filter(username__username=search_term), False
+
+
+# registering the admin class with the associated model
+admin.site.register(Comments, CommentsAdmin)
+
+
+# defining the admin class
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'send_after', 'sent_at')
+    list_filter = ('status',)
+
+
+# registering the admin class with the associated model
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+
+
+# defining the admin class
+
+
+class RequestToBeBloggerAdmin(admin.ModelAdmin):
+    list_display = ('user', 'first_name', 'last_name', 'request_date', 'status')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    actions = ['approve_requests', 'reject_requests']
+
+    @admin.action(description='Approve selected requests',
+                  permissions=['approve'])
+    def approve_requests(self, request, queryset):
+        count = approvals.approve_requests(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Approved {count} request(s).')
+
+    @admin.action(description='Reject selected requests',
+                  permissions=['approve'])
+    def reject_requests(self, request, queryset):
+        count = approvals.reject_requests(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Rejected {count} request(s).')
+
+    def has_approve_permission(self, request):
+        return request.user.has_perm('blog.can_approve_request')
+
+
+# registering the admin class with the associated model
+admin.site.register(RequestToBeBlogger, RequestToBeBloggerAdmin)
@@ -0,0 +1,220 @@
+'''a read-only JSON API over blogs, bloggers and comments
+
+For clients that want data rather than pages. Every endpoint takes
+?fields= to pick the fields it returns, and the rows are fetched with
+.values() for just those columns, so no model instances are built and
+no template is rendered. Lists are cursor paginated like the HTML
+lists (see pagination.py), ?limit= sets the page size, and the blog
+list can be narrowed to one blogger with ?blogger=<id>:
+
+    GET /blog/api/blogs/?fields=id,name,comment_count&blogger=3
+    {"results": [{"id": 7, "name": "...", "comment_count": 2}, ...],
+     "next": "/blog/api/blogs/?fields=...&cursor=...", "previous": null}
+
+The blog list is public, the rest needs a logged in user, as with the
+HTML pages.
+'''
+import json
+from datetime import date, datetime
+from functools import wraps
+
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+from . import rendering
+from .models import Blog, Blogger, Comments
+from .pagination import CursorPaginator, InvalidCursor
+from .views import COMMENT_ORDERING
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class Resource:
+    '''which public field names map to which columns, and how rows are sorted'''
+
+    def __init__(self, fields, default_fields, ordering, computed=None):
+        # public name -> lookup passed to .values()
+        self.fields = fields
+        self.default_fields = default_fields
+        self.ordering = ordering
+        # public name -> (lookups it needs, function of the row)
+        self.computed = computed or {}
+
+    def lookups(self, names):
+        lookups = set()
+        for name in names:
+            if name in self.computed:
+                lookups.update(self.computed[name][0])
+            else:
+                lookups.add(self.fields[name])
+        return lookups
+
+    def output(self, rows, names):
+        return [{name: self.computed[name][1](row) if name in self.computed
+                 else row[self.fields[name]] for name in names} for row in rows]
+
+
+def _description_html(row):
+    # Blog.rendered_description, for a row of .values()
+    if row['description_html_version'] != rendering.RENDERER_VERSION:
+        return rendering.render_markdown(row['description'])
+    return row['description_html']
+
+
+BLOGS = Resource(
+    fields={
+        'id': 'id',
+        'name': 'name',
+        'blogger': 'blogger_id',
+        'date_uploaded': 'date_uploaded',
+        'time_of_upload': 'time_of_upload',
+        'description': 'description',
+        'description_html': None,
+        'comment_count': 'comment_count',
+        'last_comment_at': 'last_comment_at',
+    },
+    default_fields=['id', 'name', 'blogger', 'comment_count', 'last_comment_at'],
+    ordering=list(Blog._meta.ordering),
+    computed={'description_html': (
+        ['description', 'description_html', 'description_html_version'], _description_html)})
+
+BLOGGERS = Resource(
+    fields={
+        'id': 'id',
+        'username': 'user__username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'bio': 'bio',
+        'date_joined': 'date_joined',
+    },
+    default_fields=['id', 'username', 'first_name', 'last_name'],
+    ordering=['last_name', 'first_name', 'id'])
+
+COMMENTS = Resource(
+    fields={
+        'id': 'id',
+        'blog': 'blog_id',
+        'user': 'username__username',
+        'comment': 'comment',
+        'date_of_comment': 'date_of_comment',
+    },
+    default_fields=['id', 'user', 'comment', 'date_of_comment'],
+    ordering=COMMENT_ORDERING)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def json_response(data, status=200):
+    return HttpResponse(_encoder.encode(data), status=status,
+                        content_type='application/json')
+
+
+def _error(message, status):
+    return json_response({'error': message}, status)
+
+
+def _requested_fields(request, resource):
+    fields = request.GET.get('fields')
+    if not fields:
+        return resource.default_fields
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown or not names:
+        raise BadRequest(f"unknown field(s): {', '.join(unknown) or fields}; "
+                         f"choose from {', '.join(resource.fields)}")
+    return names
+
+
+def _int_param(request, name, default=None):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{urlencode(query, doseq=True)}'
+
+
+def _list(request, resource, queryset):
+    names = _requested_fields(request, resource)
+    limit = min(max(_int_param(request, 'limit', DEFAULT_LIMIT), 1), MAX_LIMIT)
+    # the sort key has to be fetched too for the cursors
+    ordering_fields = [name.lstrip('-') for name in resource.ordering]
+    lookups = resource.lookups(names) | set(ordering_fields)
+    paginator = CursorPaginator(queryset.values(*lookups), limit, resource.ordering)
+    try:
+        page = paginator.page(request.GET.get(paginator.query_param))
+    except InvalidCursor:
+        raise BadRequest('invalid cursor')
+    return json_response({
+        'results': resource.output(page.object_list, names),
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    })
+
+
+def api_view(login_required=False):
+    '''GET only, errors as JSON'''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return _error('method not allowed', 405)
+            if login_required and not request.user.is_authenticated:
+                return _error('authentication required', 401)
+            try:
+                return view(request, *args, **kwargs)
+            except BadRequest as e:
+                return _error(str(e), 400)
+        return wrapper
+    return decorator
+
+
+@api_view()
+def blog_list(request):
+    blogs = Blog.objects.all()
+    blogger = _int_param(request, 'blogger')
+    if blogger is not None:
+        blogs = blogs.filter(blogger_id=blogger)
+    return _list(request, BLOGS, blogs)
+
+
+@api_view(login_required=True)
+def blog_detail(request, pk):
+    names = _requested_fields(request, BLOGS)
+    row = Blog.objects.filter(pk=pk).values(*BLOGS.lookups(names)).first()
+    if row is None:
+        return _error('not found', 404)
+    return json_response(BLOGS.output([row], names)[0])
+
+
+@api_view(login_required=True)
+def blog_comments(request, pk):
+    if not Blog.objects.filter(pk=pk).exists():
+        return _error('not found', 404)
+    return _list(request, COMMENTS, Comments.objects.filter(blog_id=pk))
+
+
+@api_view(login_required=True)
+def blogger_list(request):
+    return _list(request, BLOGGERS, Blogger.objects.all())
@@ -0,0 +1,50 @@
+'''approving and rejecting blogger requests in bulk
+
+Each call handles a whole batch in one transaction with set-based
+writes: a single UPDATE of the request status, one bulk INSERT of the
+new Blogger rows and one bulk INSERT into the email outbox, however
+many requests are selected.
+'''
+from django.conf import settings
+from django.db import transaction
+
+from . import counters, outbox
+from .models import Blogger, RequestToBeBlogger
+
+
+def approve_requests(request_ids):
+    '''approve the pending requests among request_ids and return how many'''
+    with transaction.atomic():
+        pending = list(RequestToBeBlogger.objects.filter(
+            pk__in=request_ids, status='P').select_related('user'))
+        if not pending:
+            return 0
+
+        RequestToBeBlogger.objects.filter(
+            pk__in=[r.pk for r in pending]).update(status='A')
+
+        # a user can only have one blogger, skip those that already do
+        user_ids = [r.user_id for r in pending if r.user_id is not None]
+        existing = set(Blogger.objects.filter(
+            user_id__in=user_ids).values_list('user_id', flat=True))
+        new_bloggers = Blogger.objects.bulk_create([
+            Blogger(user_id=r.user_id, first_name=r.first_name,
+                    last_name=r.last_name, bio=r.bio)
+            for r in pending if r.user_id not in existing])
+        # bulk_create doesn't send post_save, so update the counter here
+        if new_bloggers:
+            counters.increment(counters.BLOGGERS, len(new_bloggers))
+
+        outbox.enqueue_many(
+            ("Blogger Request Acceted",
+             f"CONGRATULATIONS {r.first_name} {r.last_name}, Your Request to become an author has been approved. Happy writing",
+             settings.EMAIL_HOST_USER,
+             [r.user.email])
+            for r in pending if r.user is not None and r.user.email)
+    return len(pending)
+
+
+def reject_requests(request_ids):
+    '''reject the pending requests among request_ids and return how many'''
+    return RequestToBeBlogger.objects.filter(
+        pk__in=request_ids, status='P').update(status='R')
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+
+# the async read paths, put in front of blog/urls.py by DIYblog/asgi_urls.py
+urlpatterns = [
+    path('', async_views.index, name='index'),
+    path('blogs/', async_views.blog_list, name='blogs'),
+    path('blogs/<int:pk>', async_views.blog_detail, name='blog-detail'),
+    path('blogs/<int:pk>/blogger/', async_views.bloggers_blogs, name='blogs-by-blogger'),
+]
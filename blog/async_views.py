@@ -0,0 +1,135 @@
+'''async versions of the read-heavy pages, served under DIYblog/asgi.py
+
+Under an ASGI server a sync view ties up a worker thread for the whole
+request. These views await the async ORM instead, and run independent
+queries together with asyncio.gather. Templates are still rendered
+with sync_to_async because the sidebar reads request.user and perms
+lazily. Their output matches the sync views in views.py, and the
+anonymous list pages share the same page cache entries.
+'''
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+
+from . import conditional, counters, page_cache, visits
+from .models import Blog, Blogger
+from .pagination import CursorPaginator, apaginate
+from .views import APPROXIMATE_BLOG_TOTAL, BLOG_SORTS, BLOGS_PER_PAGE, COMMENT_ORDERING, COMMENTS_PER_PAGE, blog_sort, live_comments
+
+
+async def is_authenticated(request):
+    # without a session cookie the visitor can't be logged in, which
+    # saves anonymous readers a trip to the worker thread
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    # the first look at request.user loads the session and the user
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+async def arender(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def cached_page(request, view_name, version_names, build):
+    '''VersionedPageCacheMixin.dispatch for async views'''
+    if request.method != 'GET' or await is_authenticated(request):
+        return await build()
+
+    versions = await page_cache.aget_versions(version_names)
+    key = page_cache.page_key(view_name, versions, request)
+    cached = await cache.aget(key)
+    if cached is not None:
+        await page_cache.acount(page_cache.HITS_KEY)
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    await page_cache.acount(page_cache.MISSES_KEY)
+    response = await build()
+    if response.status_code == 200:
+        await cache.aset(key, (response.content, response['Content-Type']),
+                         page_cache.CACHE_TIMEOUT)
+    return response
+
+
+async def index(request):
+    '''view for the homepage'''
+    counts, num_visits = await asyncio.gather(
+        counters.aget_counts(counters.BLOGS, counters.BLOGGERS, counters.COMMENTS),
+        visits.aget_visits(request))
+    await visits.arecord()
+
+    context = {
+        'num_blogs': counts[counters.BLOGS],
+        'num_bloggers': counts[counters.BLOGGERS],
+        'num_comments': counts[counters.COMMENTS],
+        'num_visits': num_visits,
+    }
+    response = await arender(request, 'index.html', context)
+    visits.set_visits(request, response, num_visits + 1)
+    return response
+
+
+async def blog_list(request):
+    async def build():
+        sort = blog_sort(request)
+        ordering = BLOG_SORTS[sort] if sort else Blog._meta.ordering
+        context = await apaginate(
+            request, Blog.objects.select_related('blogger').order_by(*ordering),
+            BLOGS_PER_PAGE, ordering, approximate=APPROXIMATE_BLOG_TOTAL)
+        context['blogg'] = context['object_list']
+        context['sort'] = sort
+        return await arender(request, 'blog/blog_list.html', context)
+
+    return await conditional.aconditional(
+        request, conditional.alisting_validators,
+        lambda: cached_page(request, 'BlogListView', [page_cache.LIST], build))
+
+
+async def blog_detail(request, pk):
+    if not await is_authenticated(request):
+        return redirect_to_login(request.get_full_path())
+    return await conditional.aconditional(
+        request, conditional.ablog_validators, lambda: build_blog_detail(request, pk), pk=pk)
+
+
+async def build_blog_detail(request, pk):
+    # the blog and its first page of comments don't depend on each other
+    paginator = CursorPaginator(live_comments(pk), COMMENTS_PER_PAGE, COMMENT_ORDERING)
+    try:
+        blog, page = await asyncio.gather(
+            Blog.objects.select_related('blogger').aget(pk=pk),
+            paginator.apage())
+    except Blog.DoesNotExist:
+        raise Http404('No blog found matching the query')
+
+    context = {
+        'object': blog,
+        'blogdetail': blog,
+        'comments': page.object_list,
+        'comment_page': page,
+    }
+    return await arender(request, 'blog/blog_detail.html', context)
+
+
+async def bloggers_blogs(request, pk):
+    async def build():
+        try:
+            blogger, context = await asyncio.gather(
+                Blogger.objects.select_related('user').aget(pk=pk),
+                apaginate(request, Blog.objects.filter(blogger_id=pk),
+                          BLOGS_PER_PAGE, Blog._meta.ordering))
+        except Blogger.DoesNotExist:
+            raise Http404('No blogger found matching the query')
+        context['blogger'] = blogger
+        context['blog_list'] = context['object_list']
+        return await arender(request, 'blog/blogs_by_blogger.html', context)
+
+    return await conditional.aconditional(
+        request, conditional.ablogger_validators,
+        lambda: cached_page(request, 'Bloggers_BlogsView',
+                            [page_cache.blogger_version(pk)], build), pk=pk)
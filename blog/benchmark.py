@@ -0,0 +1,260 @@
+'''seeded synthetic data and timing helpers for `manage.py bench`'''
+import random
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment)
+from django.urls import reverse
+from django.utils import timezone
+
+from . import activity, counters, search, visits
+from .models import Blog, Blogger, Comments, RequestToBeBlogger
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua garden kitchen '
+    'travel python django football music weather market river mountain '
+    'city coffee bread window summer winter story people morning night'
+).split()
+
+
+def _text(rng, median_words, max_chars):
+    '''a run of words whose length follows a long-tailed distribution'''
+    count = max(1, int(rng.lognormvariate(0, 0.6) * median_words))
+    return ' '.join(rng.choice(WORDS) for _ in range(count))[:max_chars]
+
+
+@contextmanager
+def throwaway_database():
+    '''run the block against a fresh test database that is dropped afterwards'''
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        # buffered hits belong to the throwaway database
+        visits.reset()
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def seed(bloggers=50, blogs=500, comments=5000, seed=0, batch_size=1000):
+    '''
+    Fill the database with reproducible fake content and return the
+    benchmark user, who is a superuser with a blogger profile of their own.
+    '''
+    rng = random.Random(seed)
+
+    users = User.objects.bulk_create([
+        User(username=f'bench-{seed}-{i}', email=f'bench{i}@example.com')
+        for i in range(bloggers)], batch_size=batch_size)
+    blogger_rows = Blogger.objects.bulk_create([
+        Blogger(user=user, first_name=rng.choice(WORDS).title(),
+                last_name=rng.choice(WORDS).title(),
+                bio=_text(rng, 40, 2000))
+        for user in users], batch_size=batch_size)
+    blog_rows = [
+        Blog(name=_text(rng, 5, 200).title(), blogger=rng.choice(blogger_rows),
+             description=_text(rng, 150, 2000))
+        for _ in range(blogs)]
+    # what BlogForm does when a blogger saves a post
+    for blog in blog_rows:
+        blog.render_description()
+    blog_rows = Blog.objects.bulk_create(blog_rows, batch_size=batch_size)
+    # a few popular posts collect most of the comments
+    weights = [1 / (rank + 1) for rank in range(len(blog_rows))]
+    for start in range(0, comments, batch_size):
+        Comments.objects.bulk_create([
+            Comments(username=rng.choice(users),
+                     blog=rng.choices(blog_rows, weights)[0],
+                     comment=_text(rng, 25, 1000))
+            for _ in range(min(batch_size, comments - start))])
+
+    # the bench logs in with force_login(), and --in-place may seed a
+    # real database, so the superuser gets no password anyone could use
+    user = User.objects.create_superuser(f'bench-{seed}-admin', 'admin@example.com', None)
+    blogger = Blogger.objects.create(user=user, first_name='Bench', last_name='User', bio='bench')
+    post = Blog(name='Bench post', blogger=blogger, description='bench')
+    post.render_description()
+    post.save()
+
+    # bulk_create skips the signals and views that maintain these
+    counters.reconcile()
+    activity.reconcile()
+    search.rebuild()
+    return user
+
+
+def percentile(samples, percent):
+    '''nearest-rank percentile of a list of numbers'''
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+class Route:
+    '''one named URL to benchmark, and how to request it'''
+
+    def __init__(self, name, args=None, method='get', data=None, login=False, query=None,
+                 label=None):
+        self.name = name
+        self._label = label
+        self.args = args or (lambda fixtures: [])
+        self.method = method
+        self.data = data
+        self.login = login
+        self.query = query
+
+    @property
+    def label(self):
+        if self._label:
+            return self._label
+        return self.name if self.method == 'get' else f'{self.name} ({self.method.upper()})'
+
+    def url(self, fixtures):
+        url = reverse(self.name, args=self.args(fixtures))
+        return f'{url}?{self.query}' if self.query else url
+
+
+def fixtures_for(user):
+    '''the rows the routes below point at'''
+    popular = Blog.objects.order_by('id').first()
+    own_blog = Blog.objects.filter(blogger__user=user).first()
+    comment = Comments.objects.create(username=user, comment='bench', blog=own_blog)
+    reader = User.objects.create_user(f'{user.username}-reader')
+    to_approve, to_reject = (
+        RequestToBeBlogger.objects.create(
+            user=requester, first_name='Bench', last_name='Reader', bio='bench',
+            request_date=timezone.now())
+        for requester in (reader, None))
+    return {
+        'blog': popular.pk,
+        'blogger': popular.blogger_id,
+        'own_blog': own_blog.pk,
+        'comment': comment.pk,
+        'to_approve': to_approve.pk,
+        'to_reject': to_reject.pk,
+    }
+
+
+ROUTES = [
+    Route('index'),
+    Route('blogs'),
+    # the page cache only serves anonymous visitors, this renders the list
+    Route('blogs', login=True, label='blogs (logged in)'),
+    Route('blog-detail', lambda f: [f['blog']], login=True),
+    Route('blog-comments', lambda f: [f['blog']], login=True),
+    Route('blog-search', query='q=garden'),
+    Route('bloggers', login=True),
+    Route('blogger-detail', lambda f: [f['blogger']], login=True),
+    Route('blogs-by-blogger', lambda f: [f['blogger']]),
+    Route('comment-detail', lambda f: [f['blog']], login=True),
+    Route('comment-detail', lambda f: [f['blog']], method='post',
+          data={'comment': 'a benchmark comment'}, login=True),
+    Route('comment-edit', lambda f: [f['comment']], login=True),
+    Route('comment-delete', lambda f: [f['comment']], login=True),
+    Route('request-to-be-blogger', login=True),
+    Route('request-success'),
+    Route('list-of-requests', login=True),
+    # only the first request finds the request pending
+    Route('request-approved', lambda f: [f['to_approve']], login=True),
+    Route('review-requests', method='post', login=True,
+          data=lambda f: {'request_ids': [f['to_reject']], 'action': 'reject'}),
+    Route('signup'),
+    Route('create-blog', login=True),
+    Route('edit-blog', lambda f: [f['own_blog']], login=True),
+    Route('delete-blog', lambda f: [f['own_blog']], login=True),
+    Route('api-blogs'),
+    Route('api-blogs', login=True, label='api-blogs (logged in)'),
+    Route('api-blog', lambda f: [f['blog']], login=True),
+    Route('api-blog-comments', lambda f: [f['blog']], login=True),
+    Route('api-bloggers', login=True),
+    Route('export-data', login=True),
+    Route('blog-feed-rss'),
+    Route('blog-feed-atom'),
+    Route('blogger-feed-rss', lambda f: [f['blogger']]),
+    Route('blogger-feed-atom', lambda f: [f['blogger']]),
+]
+
+# JSON routes and the HTML page that shows the same rows, both logged in
+# so that neither side is answered from the page cache
+API_PAIRS = {
+    'api-blogs (logged in)': 'blogs (logged in)',
+    'api-blog': 'blog-detail',
+    'api-blog-comments': 'blog-comments',
+    'api-bloggers': 'bloggers',
+}
+
+
+def measure(route, fixtures, user, requests=50, warmup=3):
+    '''request a route repeatedly and summarise latency, queries and size'''
+    client = Client()
+    if route.login:
+        client.force_login(user)
+    url = route.url(fixtures)
+    data = route.data(fixtures) if callable(route.data) else route.data
+    send = getattr(client, route.method)
+
+    for _ in range(warmup):
+        send(url, data)
+
+    latencies, cpu, queries, sizes = [], [], [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            start_cpu = time.process_time()
+            response = send(url, data)
+            # a streamed response does its work as it is read
+            body = (b''.join(response.streaming_content) if response.streaming
+                    else response.content)
+            cpu.append((time.process_time() - start_cpu) * 1000)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{route.label} returned {response.status_code}')
+        queries.append(len(captured))
+        sizes.append(len(body))
+
+    return {
+        'url': url,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'cpu_ms': round(sum(cpu) / len(cpu), 3),
+        'queries': max(queries),
+        'bytes': round(sum(sizes) / len(sizes)),
+    }
+
+
+def api_savings(results):
+    '''what each measured JSON route saves over its HTML page, in CPU and bytes'''
+    savings = {}
+    for api, page in API_PAIRS.items():
+        if api in results and page in results:
+            json_result, html_result = results[api], results[page]
+            savings[api] = {
+                'page': page,
+                'cpu_ms': round(html_result['cpu_ms'] - json_result['cpu_ms'], 3),
+                'bytes': html_result['bytes'] - json_result['bytes'],
+            }
+    return savings
+
+
+def compare(results, baseline, threshold):
+    '''list the regressions of results against a baseline run'''
+    regressions = []
+    for label, current in results.items():
+        previous = baseline.get(label)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f"{label}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f"{label}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
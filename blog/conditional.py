@@ -0,0 +1,120 @@
+'''answer conditional GETs for the blog pages without building them
+
+Each page gets validators that are much cheaper to look up than the
+page is to build, checked before any of the page queries run:
+
+* a blog's page: its updated_at, a single row by primary key. The
+  field is bumped whenever something the page shows changes: the blog
+  itself (auto_now), its comments or its blogger (see signals.py);
+* the blog list and a blogger's blogs: the page cache versions they are
+  stored under (see page_cache.py), which change on every write that
+  affects them. Looking those up is a cache read and no query at all,
+  so cached anonymous pages stay query free.
+
+The ETag also carries the user's id, because the sidebar is personal.
+When the browser already holds the current version it gets a 304 back
+and no template is rendered.
+'''
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import page_cache
+from .models import Blog
+
+
+def _etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _blog_validators(updated_at, user_pk):
+    '''(last modified, ETag), or None for a missing blog'''
+    if updated_at is None:
+        return None
+    return updated_at, _etag(updated_at.isoformat(), user_pk or 0)
+
+
+def blog_validators(request, pk, **kwargs):
+    updated_at = Blog.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    return _blog_validators(updated_at, request.user.pk)
+
+
+async def ablog_validators(request, pk, **kwargs):
+    updated_at = await Blog.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True).afirst()
+    return _blog_validators(updated_at, await auser_pk(request))
+
+
+def listing_validators(request, **kwargs):
+    return None, _etag(*page_cache.get_versions([page_cache.LIST]), request.user.pk or 0)
+
+
+async def alisting_validators(request, **kwargs):
+    versions = await page_cache.aget_versions([page_cache.LIST])
+    return None, _etag(*versions, await auser_pk(request) or 0)
+
+
+def blogger_validators(request, pk, **kwargs):
+    versions = page_cache.get_versions([page_cache.blogger_version(pk)])
+    return None, _etag(*versions, request.user.pk or 0)
+
+
+async def ablogger_validators(request, pk, **kwargs):
+    versions = await page_cache.aget_versions([page_cache.blogger_version(pk)])
+    return None, _etag(*versions, await auser_pk(request) or 0)
+
+
+async def auser_pk(request):
+    # like async_views.is_authenticated, anonymous readers skip the thread hop
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return None
+    return await sync_to_async(lambda: request.user.pk)()
+
+
+def not_modified(request, found):
+    '''the 304 (or 412) answering request, or None if the page must be built'''
+    if found is None:
+        return None
+    last_modified, etag = found
+    return get_conditional_response(
+        request, etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None)
+
+
+def add_validators(response, found):
+    if found is not None and response.status_code in (200, 304):
+        last_modified, etag = found
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified.timestamp()))
+    return response
+
+
+def conditional(validators):
+    '''
+    Decorate a view to answer GET and HEAD requests with a 304 when the
+    validators(request, **kwargs) of its page haven't changed.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            found = validators(request, **kwargs)
+            response = not_modified(request, found) or view(request, *args, **kwargs)
+            return add_validators(response, found)
+        return wrapper
+    return decorator
+
+
+async def aconditional(request, validators, build, **kwargs):
+    '''conditional() for async views, build() makes the page'''
+    if request.method not in ('GET', 'HEAD'):
+        return await build()
+    found = await validators(request, **kwargs)
+    response = not_modified(request, found) or await build()
+    return add_validators(response, found)
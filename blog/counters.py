@@ -0,0 +1,100 @@
+'''site-wide running totals shown on the homepage
+
+Instead of running a COUNT(*) over every table on each homepage hit,
+the totals live in the SiteCounter table. They are adjusted with F()
+increments inside the same transaction as the write that changed them,
+and a cache sits in front so a read is usually a single cache lookup.
+'''
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blog, Blogger, Comments, SiteCounter
+
+BLOGS = 'blogs'
+BLOGGERS = 'bloggers'
+COMMENTS = 'comments'
+
+# how to recompute each counter from scratch
+SOURCES = {
+    BLOGS: lambda: Blog.objects.count(),
+    BLOGGERS: lambda: Blogger.objects.count(),
+    COMMENTS: lambda: Comments.objects.count(),
+}
+
+CACHE_TIMEOUT = getattr(settings, 'COUNTERS_CACHE_TIMEOUT', 300)
+
+
+def _cache_key(name):
+    return f'blog:counter:{name}'
+
+
+def _forget(*names):
+    '''drop the cached values once the surrounding transaction commits'''
+    keys = [_cache_key(name) for name in names]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def increment(name, delta=1):
+    '''adjust a counter by delta in the current transaction'''
+    updated = SiteCounter.objects.filter(name=name).update(
+        value=F('value') + delta)
+    if not updated:
+        # the row has never been created, so the table is the only
+        # trustworthy source for the current total
+        reconcile([name])
+        return
+    _forget(name)
+
+
+def get_counts(*names):
+    '''return a {name: value} dict, hitting the database only on a cache miss'''
+    keys = {_cache_key(name): name for name in names}
+    cached = cache.get_many(keys)
+    counts = {keys[key]: value for key, value in cached.items()}
+
+    missing = [name for name in names if name not in counts]
+    if missing:
+        rows = dict(SiteCounter.objects.filter(
+            name__in=missing).values_list('name', 'value'))
+        absent = [name for name in missing if name not in rows]
+        if absent:
+            rows.update(reconcile(absent))
+        counts.update(rows)
+        cache.set_many({_cache_key(name): rows[name] for name in missing},
+                       CACHE_TIMEOUT)
+    return counts
+
+
+async def aget_counts(*names):
+    '''get_counts() for async views'''
+    keys = {_cache_key(name): name for name in names}
+    cached = await cache.aget_many(keys)
+    counts = {keys[key]: value for key, value in cached.items()}
+
+    missing = [name for name in names if name not in counts]
+    if missing:
+        rows = {name: value async for name, value in SiteCounter.objects.filter(
+            name__in=missing).values_list('name', 'value')}
+        absent = [name for name in missing if name not in rows]
+        if absent:
+            rows.update(await sync_to_async(reconcile)(absent))
+        counts.update(rows)
+        await cache.aset_many({_cache_key(name): rows[name] for name in missing},
+                              CACHE_TIMEOUT)
+    return counts
+
+
+def reconcile(names=None):
+    '''recompute counters from the underlying tables and store the result'''
+    names = list(names or SOURCES)
+    totals = {}
+    with transaction.atomic():
+        for name in names:
+            totals[name] = SOURCES[name]()
+            SiteCounter.objects.update_or_create(
+                name=name, defaults={'value': totals[name]})
+        _forget(*names)
+    return totals
@@ -0,0 +1,308 @@
+'''bulk export and import of the blog's content as JSON Lines
+
+One JSON object per line, each with a "type" (user, blogger, blog or
+comment) and the row's "id" in the database it came from. References
+to other rows use those ids, and every row comes after the rows it
+refers to, so both sides can stream:
+
+    {"type": "user", "id": 3, "username": "ann", ...}
+    {"type": "blogger", "id": 1, "user": 3, "first_name": "Ann", ...}
+    {"type": "blog", "id": 9, "blogger": 1, "name": "Tomatoes", ...}
+    {"type": "comment", "id": 40, "blog": 9, "username": 3, ...}
+
+The export reads each table with .iterator(), and the import keeps only
+a batch of rows plus a map from exported to new ids for users, bloggers
+and blogs; comments, the bulk of the data, are never held on to.
+Passwords are not exported, imported users have to reset theirs. Users
+whose username already exists are reused, as is their blogger profile.
+'''
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import counters, page_cache, search
+from .models import Blog, Blogger, Comments
+
+USER = 'user'
+BLOGGER = 'blogger'
+BLOG = 'blog'
+COMMENT = 'comment'
+
+# (type, model, exported fields, {field: type it refers to}), in file order
+TABLES = [
+    (USER, User, ['username', 'email', 'first_name', 'last_name', 'date_joined'], {}),
+    (BLOGGER, Blogger, ['first_name', 'last_name', 'date_of_birth', 'date_joined', 'bio'],
+     {'user': USER}),
+    (BLOG, Blog, ['name', 'description', 'date_uploaded', 'time_of_upload',
+                  'is_deleted', 'deleted_at'],
+     {'blogger': BLOGGER}),
+    (COMMENT, Comments, ['comment', 'date_of_comment', 'deleted', 'deleted_at'],
+     {'blog': BLOG, 'username': USER}),
+]
+ORDER = [table[0] for table in TABLES]
+
+
+class DataError(Exception):
+    '''the input can't be imported'''
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _manager(model):
+    # deleted blogs and comments travel too, with their flags
+    return getattr(model, 'all_objects', model._default_manager)
+
+
+def export_lines(chunk_size=2000):
+    '''every row as a line of JSON, streamed table by table'''
+    encoder = json.JSONEncoder(default=_default, ensure_ascii=False)
+    for kind, model, fields, references in TABLES:
+        columns = ['id', *fields, *(f'{name}_id' for name in references)]
+        rows = _manager(model).order_by('id').values_list(*columns)
+        for row in rows.iterator(chunk_size=chunk_size):
+            record = {'type': kind}
+            record.update(zip(['id', *fields, *references], row))
+            yield encoder.encode(record) + '\n'
+
+
+def _timestamps(model):
+    return [field for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now_add', False) or getattr(field, 'auto_now', False)]
+
+
+def _insert_objects(model, objs):
+    '''
+    bulk_create() without the fields' pre_save(), so auto_now_add fields
+    keep the exported times: the raw insert loaddata makes through
+    Model.save_base(raw=True). Sets the new pks on objs.
+    '''
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    returning_fields = model._meta.db_returning_fields
+    manager = _manager(model)
+    batch_size = connection.ops.bulk_batch_size(fields, objs)
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+        rows = manager._insert(batch, fields=fields, returning_fields=returning_fields,
+                               raw=True, using=connection.alias)
+        for obj, row in zip(batch, rows):
+            for field, value in zip(returning_fields, row):
+                setattr(obj, field.attname, value)
+            obj._state.adding = False
+            obj._state.db = connection.alias
+
+
+def _converter(field):
+    '''a function turning an exported value into the field's Python type'''
+    if field.get_internal_type() != 'DateTimeField':
+        return field.to_python
+
+    def to_datetime(value):
+        # the ISO strings of an export parse without to_python()'s regex
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            value = field.to_python(value)
+        # what the field would do on save, without its warning per row
+        if value is not None and settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+    return to_datetime
+
+
+def _is_key(value):
+    '''whether an exported id or reference can stand for a row'''
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+class Importer:
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        # exported id -> new id, for the types other rows refer to
+        self.ids = {USER: {}, BLOGGER: {}, BLOG: {}}
+        self.pending = {kind: [] for kind in ORDER}
+        self.last_kind = None
+        self.created = {kind: 0 for kind in ORDER}
+        self.bloggers_touched = set()
+        # new blog id -> [live comments, latest comment], see _save_comment
+        self.activity = {}
+        self.fields = {kind: [(name, _converter(model._meta.get_field(name))) for name in fields]
+                       for kind, model, fields, _ in TABLES}
+        # filled in when not exported, as the inserts skip pre_save()
+        self.stamps = {kind: _timestamps(model) for kind, model, _, _ in TABLES}
+        # comments, the bulk of an import, go in without model instances;
+        # their values have been through to_python() in add() already
+        self.comment_columns = [
+            (field.attname, field.get_prep_value(field.get_default()), field.get_db_prep_value)
+            for field in Comments._meta.concrete_fields if not field.primary_key]
+
+    def add(self, record, line_number=None):
+        kind = record.get('type') if isinstance(record, dict) else None
+        if not isinstance(kind, str) or kind not in self.pending:
+            raise DataError(f'line {line_number}: unknown type {kind!r}')
+        if kind != self.last_kind:
+            # rows refer back to earlier types, which must be written by now
+            for earlier in ORDER[:ORDER.index(kind)]:
+                self.flush(earlier)
+            self.last_kind = kind
+        references = TABLES[ORDER.index(kind)][3]
+        values = {}
+        for name, to_python in self.fields[kind]:
+            value = record.get(name)
+            if value is None:
+                continue
+            try:
+                values[name] = to_python(value)
+            except ValidationError as e:
+                raise DataError(f"line {line_number}: {name}: {' '.join(e.messages)}")
+            except (TypeError, ValueError) as e:
+                raise DataError(f'line {line_number}: {name}: {e}')
+        for field in self.stamps[kind]:
+            if field.name not in values:
+                values[field.name] = timezone.now()
+        for field, target in references.items():
+            source = record.get(field)
+            if source is None:
+                continue
+            if not _is_key(source):
+                raise DataError(f'line {line_number}: {field} {source!r} is not an id')
+            try:
+                values[f'{field}_id'] = self.ids[target][source]
+            except KeyError:
+                raise DataError(f'line {line_number}: unknown {target} {source}')
+        source = record.get('id')
+        if source is not None and not _is_key(source):
+            raise DataError(f'line {line_number}: id {source!r} is not an id')
+        self.pending[kind].append((source, values))
+        if len(self.pending[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def flush(self, kind):
+        rows = self.pending[kind]
+        if not rows:
+            return
+        self.pending[kind] = []
+        with transaction.atomic():
+            getattr(self, f'_save_{kind}')(rows)
+
+    def _remember(self, kind, rows):
+        ids = self.ids[kind]
+        for source, obj in rows:
+            if source is not None:
+                ids[source] = obj.pk
+
+    def _save_user(self, rows):
+        rows = [(source, User(**values)) for source, values in rows]
+        existing = dict(User.objects.filter(
+            username__in=[user.username for _, user in rows]).values_list('username', 'pk'))
+        new = []
+        for source, user in rows:
+            if user.username in existing:
+                user.pk = existing[user.username]
+            else:
+                user.set_unusable_password()
+                new.append(user)
+        User.objects.bulk_create(new)
+        self.created[USER] += len(new)
+        self._remember(USER, rows)
+
+    def _save_blogger(self, rows):
+        rows = [(source, Blogger(**values)) for source, values in rows]
+        existing = dict(Blogger.objects.filter(
+            user_id__in=[b.user_id for _, b in rows if b.user_id]).values_list('user_id', 'pk'))
+        new = []
+        for source, blogger in rows:
+            if blogger.user_id in existing:
+                blogger.pk = existing[blogger.user_id]
+            else:
+                new.append(blogger)
+        Blogger.objects.bulk_create(new)
+        self.created[BLOGGER] += len(new)
+        self._remember(BLOGGER, rows)
+
+    def _save_blog(self, rows):
+        blogs = [Blog(**values) for _, values in rows]
+        # what BlogForm does for a blog saved by hand
+        for blog in blogs:
+            blog.render_description()
+        _insert_objects(Blog, blogs)
+        search.index_new_blogs(blogs)
+        self.bloggers_touched.update(blog.blogger_id for blog in blogs)
+        self.created[BLOG] += len(blogs)
+        self._remember(BLOG, [(source, blog) for (source, _), blog in zip(rows, blogs)])
+
+    def _save_comment(self, rows):
+        # the connection itself, not the per-thread proxy looked up for every value
+        db = connections[connection.alias]
+        params = []
+        for _, values in rows:
+            params.append([prepare(values.get(attname, default), db, prepared=True)
+                           for attname, default, prepare in self.comment_columns])
+            if not values.get('deleted'):
+                stats = self.activity.setdefault(values.get('blog_id'), [0, None])
+                stats[0] += 1
+                date = values['date_of_comment']
+                if stats[1] is None or date > stats[1]:
+                    stats[1] = date
+        _insert_rows(Comments, [attname for attname, _, _ in self.comment_columns], params)
+        self.created[COMMENT] += len(rows)
+
+    def finish(self):
+        '''write what is left and redo what the skipped signals and views maintain'''
+        for kind in ORDER:
+            self.flush(kind)
+        # the imported blogs are new, so their comments are all imported too
+        last_comment_at = Blog._meta.get_field('last_comment_at')
+        with transaction.atomic():
+            _update(Blog, ['comment_count', 'last_comment_at'], [
+                (count, last_comment_at.get_db_prep_save(last, connection), pk)
+                for pk, (count, last) in self.activity.items()])
+        counters.reconcile()
+        page_cache.bump(page_cache.LIST, page_cache.FEED, *(
+            version(pk) for pk in self.bloggers_touched
+            for version in (page_cache.blogger_version, page_cache.feed_blogger_version)))
+        return self.created
+
+
+def _insert_rows(model, attnames, params):
+    '''params are database values for the attnames columns, in order'''
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column)
+                        for name in attnames)
+    placeholders = ', '.join(['%s'] * len(attnames))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} '
+            f'({columns}) VALUES ({placeholders})', params)
+
+
+def _update(model, attnames, params):
+    '''params are the new values followed by the primary key'''
+    assignments = ', '.join(f'{connection.ops.quote_name(model._meta.get_field(name).column)} = %s'
+                            for name in attnames)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {connection.ops.quote_name(model._meta.db_table)} '
+            f'SET {assignments} WHERE {connection.ops.quote_name(model._meta.pk.column)} = %s',
+            params)
+
+
+def import_lines(lines, batch_size=5000):
+    '''import an iterable of JSON lines and return {type: rows created}'''
+    importer = Importer(batch_size)
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise DataError(f'line {line_number}: {e}')
+        importer.add(record, line_number)
+    return importer.finish()
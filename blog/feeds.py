@@ -0,0 +1,140 @@
+'''RSS and Atom feeds of the newest blogs, overall and per blogger
+
+Feed readers poll, usually every few minutes, so a poll must be cheap.
+The generated XML is cached under the page cache versions FEED and
+feed_blogger_version(pk), which signals.py bumps when a blog is
+created, edited or (soft-)deleted and when a blogger changes. Comments
+are not in the feeds and leave them alone. A poll is then:
+
+* a client sending the ETag of the current versions: one cache read and
+  a 304;
+* any other client: one more cache read for the XML;
+* the first poll after a change: one query for the newest FEED_ITEMS
+  live blogs, served by the (time_of_upload, id) indexes on Blog.
+'''
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe
+
+from . import conditional, page_cache
+from .models import Blog, Blogger
+
+FEED_ITEMS = getattr(settings, 'BLOG_FEED_ITEMS', 20)
+# the versions in the key keep the XML fresh, this only frees the memory
+CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 3600)
+
+# just what the feed items show
+ITEM_FIELDS = ['name', 'time_of_upload', 'updated_at', 'description', 'description_html',
+               'description_html_version', 'blogger__first_name', 'blogger__last_name']
+
+
+def newest(blogs):
+    return (blogs.select_related('blogger').only(*ITEM_FIELDS)
+            .order_by('-time_of_upload', '-id')[:FEED_ITEMS])
+
+
+class LatestBlogsFeed(Feed):
+    title = 'Mini-Blog: latest blogs'
+    description = 'The newest blogs on Mini-Blog.'
+
+    def link(self):
+        return reverse('blogs')
+
+    def items(self):
+        return newest(Blog.objects.all())
+
+    def item_title(self, item):
+        return item.name
+
+    def item_description(self, item):
+        return item.rendered_description
+
+    def item_author_name(self, item):
+        return str(item.blogger) if item.blogger else None
+
+    def item_pubdate(self, item):
+        return item.time_of_upload
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+
+class AtomLatestBlogsFeed(LatestBlogsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestBlogsFeed.description
+
+
+class BloggerBlogsFeed(LatestBlogsFeed):
+    def get_object(self, request, pk):
+        return get_object_or_404(Blogger, pk=pk)
+
+    def title(self, obj):
+        return f'Mini-Blog: blogs by {obj.first_name} {obj.last_name}'
+
+    def description(self, obj):
+        return f'The newest blogs by {obj.first_name} {obj.last_name}.'
+
+    def link(self, obj):
+        return reverse('blogs-by-blogger', args=[obj.pk])
+
+    def items(self, obj):
+        return newest(Blog.objects.filter(blogger=obj))
+
+
+class AtomBloggerBlogsFeed(BloggerBlogsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+def _last_modified(response):
+    timestamp = parse_http_date_safe(response.get('Last-Modified', ''))
+    return datetime.fromtimestamp(timestamp, timezone.utc) if timestamp else None
+
+
+def cached(feed, versions):
+    '''a view serving feed from the cache, versions(**kwargs) names what it shows'''
+    def view(request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return feed(request, **kwargs)
+        found_versions = page_cache.get_versions(versions(**kwargs))
+        etag = conditional._etag(type(feed).__name__, *found_versions)
+        # the ETag alone is enough to answer a client that is up to date
+        response = conditional.not_modified(request, (None, etag))
+        if response is not None:
+            return conditional.add_validators(response, (None, etag))
+
+        key = page_cache.page_key(type(feed).__name__, found_versions, request)
+        cached = cache.get(key)
+        if cached is None:
+            response = feed(request, **kwargs)
+            cached = (response.content, response['Content-Type'], _last_modified(response))
+            cache.set(key, cached, CACHE_TIMEOUT)
+        content, content_type, last_modified = cached
+        found = (last_modified, etag)
+        response = conditional.not_modified(request, found) or HttpResponse(
+            content, content_type=content_type)
+        return conditional.add_validators(response, found)
+    return view
+
+
+def _global_versions():
+    return [page_cache.FEED]
+
+
+def _blogger_versions(pk):
+    return [page_cache.feed_blogger_version(pk)]
+
+
+latest_rss = cached(LatestBlogsFeed(), _global_versions)
+latest_atom = cached(AtomLatestBlogsFeed(), _global_versions)
+blogger_rss = cached(BloggerBlogsFeed(), _blogger_versions)
+blogger_atom = cached(AtomBloggerBlogsFeed(), _blogger_versions)
@@ -47,3 +47,8 @@ class BlogForm(forms.ModelForm):
     class Meta:
         model = Blog
         fields = ['name', 'description']
+
+    def save(self, commit=True):
+        # render the Markdown here, once, instead of on every view
+        self.instance.render_description('description' in self.changed_data)
+        return super().save(commit)
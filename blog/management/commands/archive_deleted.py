@@ -0,0 +1,71 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog.models import ArchivedBlog, ArchivedComment, Blog, Comments
+
+COMMENT_FIELDS = ['blog_id', 'username_id', 'date_of_comment',
+                  'comment', 'deleted', 'deleted_at']
+BLOG_FIELDS = ['name', 'blogger_id', 'time_of_upload', 'description',
+               'date_uploaded', 'deleted_at']
+
+
+def _move(queryset, archive_model, fields, batch_size):
+    '''copy one batch of rows into the archive and delete them, returning how many'''
+    with transaction.atomic():
+        rows = list(queryset.values('id', *fields)[:batch_size])
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        archive_model.objects.bulk_create(
+            [archive_model(original_id=row['id'], **{f: row[f] for f in fields})
+             for row in rows],
+            ignore_conflicts=True)
+        queryset.model.all_objects.filter(id__in=ids).delete()
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = ('Move soft-deleted blogs and comments older than the retention '
+            'window into the archive tables, a small batch at a time')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='keep soft-deleted rows this many days before archiving them')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='seconds to sleep between batches so other writers get a turn')
+
+    def drain(self, queryset, archive_model, fields, options):
+        total = 0
+        while True:
+            moved = _move(queryset, archive_model, fields, options['batch_size'])
+            if not moved:
+                return total
+            total += moved
+            if options['pause']:
+                time.sleep(options['pause'])
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        # deleted comments first, then every comment of an expired blog,
+        # so that deleting the blogs themselves never cascades into an
+        # unbounded number of comment rows
+        comments = self.drain(
+            Comments.all_objects.filter(deleted=True, deleted_at__lt=cutoff),
+            ArchivedComment, COMMENT_FIELDS, options)
+        comments += self.drain(
+            Comments.all_objects.filter(
+                blog__is_deleted=True, blog__deleted_at__lt=cutoff),
+            ArchivedComment, COMMENT_FIELDS, options)
+        blogs = self.drain(
+            Blog.all_objects.filter(is_deleted=True, deleted_at__lt=cutoff),
+            ArchivedBlog, BLOG_FIELDS, options)
+
+        self.stdout.write(f'Archived {blogs} blogs and {comments} comments.')
@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from blog import benchmark, throttling
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database with synthetic content, request every '
+            'route and report latency percentiles, query counts and page sizes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bloggers', type=int, default=50)
+        parser.add_argument('--blogs', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='timed requests per route')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='untimed requests per route before timing')
+        parser.add_argument('--route', action='append', dest='routes',
+                            help='only benchmark these route labels')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--baseline', help='compare against this JSON file')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='allowed p95 slowdown against the baseline (0.2 = 20%%)')
+        parser.add_argument('--in-place', action='store_true',
+                            help='seed the configured database instead of a '
+                                 'temporary test database')
+
+    def handle(self, *args, **options):
+        if options['in_place']:
+            return self.run(options)
+
+        with benchmark.throwaway_database():
+            self.run(options)
+
+    # the write routes are requested far faster than the rate limits allow
+    @override_settings(THROTTLE_RATES=throttling.UNLIMITED)
+    def run(self, options):
+        user = benchmark.seed(options['bloggers'], options['blogs'],
+                              options['comments'], options['seed'])
+        fixtures = benchmark.fixtures_for(user)
+
+        routes = benchmark.ROUTES
+        if options['routes']:
+            routes = [r for r in routes if r.label in options['routes']]
+
+        results = {}
+        self.stdout.write(f"{'route':<32}{'p50':>9}{'p95':>9}{'p99':>9}{'cpu':>9}"
+                          f"{'queries':>9}{'bytes':>9}")
+        for route in routes:
+            result = benchmark.measure(route, fixtures, user,
+                                       options['requests'], options['warmup'])
+            results[route.label] = result
+            self.stdout.write(
+                f"{route.label:<32}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['cpu_ms']:>9.2f}"
+                f"{result['queries']:>9}{result['bytes']:>9}")
+
+        savings = benchmark.api_savings(results)
+        if savings:
+            self.stdout.write('\nJSON API against the HTML pages:')
+            for label, saved in savings.items():
+                self.stdout.write(
+                    f"{label:<32}{saved['cpu_ms']:>9.2f} ms CPU{saved['bytes']:>9} bytes "
+                    f"less than {saved['page']}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = benchmark.compare(
+                    results, json.load(baseline), options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n  '
+                                   + '\n  '.join(regressions))
+            self.stdout.write('No regressions against the baseline.')
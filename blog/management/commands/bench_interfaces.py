@@ -0,0 +1,139 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from blog import benchmark
+
+READ_ROUTES = ['index', 'blogs', 'blog-detail', 'blogs-by-blogger']
+
+
+def wsgi_environ(path, query, cookie):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': cookie,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+    }
+
+
+def asgi_scope(path, query, cookie):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of the WSGI and ASGI entry points on the '
+            'read paths with many requests in flight at once')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bloggers', type=int, default=50)
+        parser.add_argument('--blogs', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--connections', type=int, default=32,
+                            help='requests in flight at once')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='requests per route and entry point')
+        parser.add_argument('--route', action='append', dest='routes',
+                            choices=READ_ROUTES, help='default: all of them')
+
+    def handle(self, *args, **options):
+        with benchmark.throwaway_database():
+            user = benchmark.seed(options['bloggers'], options['blogs'],
+                                  options['comments'], options['seed'])
+            fixtures = benchmark.fixtures_for(user)
+            client = Client()
+            client.force_login(user)
+            session_cookie = f"sessionid={client.cookies['sessionid'].value}"
+
+            self.stdout.write(f"{'route':<20}{'entry':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+            routes = [r for r in benchmark.ROUTES
+                      if r.method == 'get' and r.name in (options['routes'] or READ_ROUTES)]
+            for route in routes:
+                path, _, query = route.url(fixtures).partition('?')
+                cookie = session_cookie if route.login else ''
+                self.report(route.name, 'wsgi', self.run_wsgi(path, query, cookie, options))
+                # what DIYblog/settings_asgi.py sets up, from inside an already configured process
+                with override_settings(ROOT_URLCONF='DIYblog.asgi_urls'):
+                    self.report(route.name, 'asgi', asyncio.run(
+                        self.run_asgi(path, query, cookie, options)))
+
+    def report(self, route, entry, result):
+        elapsed, latencies = result
+        latencies.sort()
+        self.stdout.write(
+            f'{route:<20}{entry:<7}{len(latencies) / elapsed:>9.1f}'
+            f'{benchmark.percentile(latencies, 50):>9.2f}'
+            f'{benchmark.percentile(latencies, 95):>9.2f}')
+
+    def run_wsgi(self, path, query, cookie, options):
+        '''a threaded WSGI server: one thread per connection'''
+        application = WSGIHandler()
+
+        def one_request(_):
+            status = []
+            start = time.perf_counter()
+            body = b''.join(application(
+                wsgi_environ(path, query, cookie),
+                lambda s, headers, exc_info=None: status.append(s)))
+            if not status[0].startswith('200') or not body:
+                raise CommandError(f'{path} returned {status[0]}')
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['connections']) as pool:
+            latencies = list(pool.map(one_request, range(options['requests'])))
+        return time.perf_counter() - start, latencies
+
+    async def run_asgi(self, path, query, cookie, options):
+        '''an ASGI server: every connection a task on one event loop'''
+        application = ASGIHandler()
+        slots = asyncio.Semaphore(options['connections'])
+
+        async def one_request():
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            async with slots:
+                start = time.perf_counter()
+                await application(asgi_scope(path, query, cookie), receive, send)
+                elapsed = (time.perf_counter() - start) * 1000
+            if messages[0]['status'] != 200:
+                raise CommandError(f"{path} returned {messages[0]['status']}")
+            return elapsed
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one_request() for _ in range(options['requests'])))
+        return time.perf_counter() - start, list(latencies)
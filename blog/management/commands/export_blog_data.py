@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog import datatransfer
+
+
+class Command(BaseCommand):
+    help = 'Export the users, bloggers, blogs and comments as JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='file to write to, - for standard output')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        lines = datatransfer.export_lines(options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            f.writelines(lines)
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog import static_export
+
+
+class Command(BaseCommand):
+    help = ('Render the public blog pages to HTML files, re-rendering only the '
+            'pages whose rows changed since the last export')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='directory to write the pages to')
+        parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                            help='worker processes, 1 renders in this process')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='pages handed to a worker at a time')
+        parser.add_argument('--full', action='store_true',
+                            help='ignore the manifest and render every page')
+
+    def handle(self, *args, **options):
+        out_dir = options['output']
+        manifest = static_export.load_manifest(out_dir)
+        templates = static_export.templates_fingerprint()
+        if options['full'] or manifest['templates'] != templates:
+            manifest = {'templates': templates, 'pages': {}}
+
+        pages = static_export.plan()
+        stale = [(path, kind, argument)
+                 for path, (kind, argument, fingerprint) in pages.items()
+                 if manifest['pages'].get(path) != fingerprint
+                 or not os.path.exists(os.path.join(out_dir, path))]
+        removed = [path for path in manifest['pages'] if path not in pages]
+
+        batch_size = options['batch_size']
+        batches = [stale[i:i + batch_size] for i in range(0, len(stale), batch_size)]
+        if options['jobs'] > 1 and len(batches) > 1:
+            # workers open their own connections
+            connections.close_all()
+            with ProcessPoolExecutor(options['jobs'], initializer=static_export.worker_init) as pool:
+                results = list(pool.map(static_export.render_batch,
+                                        [out_dir] * len(batches), batches))
+        else:
+            results = [static_export.render_batch(out_dir, batch) for batch in batches]
+
+        for path in removed:
+            try:
+                os.remove(os.path.join(out_dir, path))
+            except FileNotFoundError:
+                pass
+            del manifest['pages'][path]
+        for written in results:
+            for path in written:
+                manifest['pages'][path] = pages[path][2]
+        manifest['templates'] = templates
+        static_export.save_manifest(out_dir, manifest)
+
+        rendered = sum(len(written) for written in results)
+        self.stdout.write(f'Rendered {rendered} of {len(pages)} pages, removed {len(removed)}.')
@@ -0,0 +1,28 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import datatransfer
+
+
+class Command(BaseCommand):
+    help = ('Import users, bloggers, blogs and comments from a JSON Lines file '
+            'written by export_blog_data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='file to read, - for standard input')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='rows inserted per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            if options['input'] == '-':
+                created = datatransfer.import_lines(sys.stdin, options['batch_size'])
+            else:
+                with open(options['input'], encoding='utf-8') as f:
+                    created = datatransfer.import_lines(f, options['batch_size'])
+        except (datatransfer.DataError, ValidationError) as e:
+            raise CommandError(f'Import stopped: {e}')
+        self.stdout.write(', '.join(f'{count} {kind}s' for kind, count in created.items())
+                          + ' imported.')
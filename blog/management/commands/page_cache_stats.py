@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import page_cache
+
+
+class Command(BaseCommand):
+    help = 'Show how often the anonymous page cache was hit'
+
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}\n"
+            f"misses: {stats['misses']}\n"
+            f"hit ratio: {stats['hit_ratio']:.1%}")
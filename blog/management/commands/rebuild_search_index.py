@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over the live blogs'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stdout.write('Search uses icontains on this database, nothing to rebuild.')
+            return
+        count = search.rebuild()
+        self.stdout.write(f'Indexed {count} blogs.')
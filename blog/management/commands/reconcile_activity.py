@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from blog import activity
+
+
+class Command(BaseCommand):
+    help = ("Recompute each blog's comment count and last activity from its "
+            'comments, fixing the ones that drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='blogs checked per query')
+
+    def handle(self, *args, **options):
+        fixed = activity.reconcile(options['chunk_size'])
+        self.stdout.write(f'Fixed {fixed} blogs.')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the homepage counters from the underlying tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help='counters to rebuild (default: all of them)')
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(counters.SOURCES)
+        if unknown:
+            raise CommandError(
+                f'Unknown counter(s): {", ".join(sorted(unknown))}')
+
+        totals = counters.reconcile(options['names'])
+        for name, value in sorted(totals.items()):
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,68 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog import rendering
+from blog.models import Blog
+
+
+class Command(BaseCommand):
+    help = ('Re-render the HTML of blog descriptions that were rendered by an '
+            'older version of the Markdown renderer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                            help='worker processes, 1 renders in this process')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='blogs handed to a worker at a time')
+        parser.add_argument('--all', action='store_true',
+                            help='re-render every blog, not only the stale ones')
+
+    def handle(self, *args, **options):
+        blogs = Blog.all_objects.all()
+        if not options['all']:
+            blogs = blogs.exclude(description_html_version=rendering.RENDERER_VERSION)
+        ids = list(blogs.order_by('id').values_list('id', flat=True))
+
+        batch_size = options['batch_size']
+        batches = (ids[i:i + batch_size] for i in range(0, len(ids), batch_size))
+        # the workers only turn Markdown into HTML, reading and writing
+        # the rows stays in this process
+        rows = (list(Blog.all_objects.filter(id__in=batch).values_list('id', 'description'))
+                for batch in batches)
+
+        updated = 0
+        jobs = options['jobs']
+        if jobs > 1 and len(ids) > batch_size:
+            with ProcessPoolExecutor(jobs) as pool:
+                # pool.map() would read every batch before the first result,
+                # a couple queued per worker keeps them busy just as well
+                in_flight = deque()
+                for batch in rows:
+                    in_flight.append(pool.submit(rendering.render_batch, batch))
+                    if len(in_flight) >= jobs * 2:
+                        updated += self.save(in_flight.popleft().result())
+                while in_flight:
+                    updated += self.save(in_flight.popleft().result())
+        else:
+            for batch in rows:
+                updated += self.save(rendering.render_batch(batch))
+        self.stdout.write(f'Re-rendered {updated} of {len(ids)} blogs.')
+
+    def save(self, rendered):
+        now = timezone.now()
+        updated = 0
+        with transaction.atomic():
+            for pk, description, html in rendered:
+                # skip blogs edited since they were read, the edit
+                # already stored HTML for the new description
+                updated += Blog.all_objects.filter(pk=pk, description=description).update(
+                    description_html=html,
+                    description_html_version=rendering.RENDERER_VERSION,
+                    # the blog's page changed, see conditional.py
+                    updated_at=now)
+        return updated
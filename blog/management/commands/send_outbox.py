@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send the queued emails in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='keep running and poll for new emails')
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='seconds to wait between polls when the outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.send_batch(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'sent {sent}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
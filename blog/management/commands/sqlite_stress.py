@@ -0,0 +1,128 @@
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment)
+from django.urls import reverse
+
+from blog import sqlite, throttling, visits
+from blog.models import Blog, Blogger
+
+
+class Command(BaseCommand):
+    help = ('Hammer a throwaway SQLite file with concurrent comment posts and '
+            'blog list reads, and report throughput and lock errors')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--write-ratio', type=float, default=0.3,
+                            help='share of requests that post a comment')
+        parser.add_argument('--compare', action='store_true',
+                            help="run once with SQLite's defaults first")
+
+    def handle(self, *args, **options):
+        phases = [('configured pragmas', getattr(settings, 'SQLITE_PRAGMAS', {}))]
+        if options['compare']:
+            phases.insert(0, ('sqlite defaults', {}))
+
+        # the views re-raise lock errors into the workers, which count
+        # them, so keep the 500 tracebacks out of the output
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for label, pragmas in phases:
+                # the point is to saturate the writer, so no rate limits
+                with tempfile.TemporaryDirectory() as tmpdir, \
+                        override_settings(SQLITE_PRAGMAS=pragmas,
+                                          THROTTLE_RATES=throttling.UNLIMITED):
+                    result = self.run_phase(os.path.join(tmpdir, 'stress.sqlite3'), options)
+                self.stdout.write(
+                    f"{label:<20} journal={result['journal_mode']:<8} "
+                    f"reads/s={result['reads'] / options['seconds']:>8.1f} "
+                    f"writes/s={result['writes'] / options['seconds']:>8.1f} "
+                    f"lock errors={result['locked']} other errors={result['failed']}")
+        finally:
+            request_logger.setLevel(level)
+
+    def run_phase(self, path, options):
+        test_settings = connection.settings_dict['TEST']
+        old_name = test_settings['NAME']
+        test_settings['NAME'] = path
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            return self.hammer(options)
+        finally:
+            visits.reset()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            test_settings['NAME'] = old_name
+
+    def hammer(self, options):
+        user = User.objects.create_user('stress', password='stress')
+        blogger = Blogger.objects.create(user=user, first_name='Stress', last_name='Test')
+        blogs = [Blog.objects.create(name=f'Stress blog {i}', blogger=blogger,
+                                     description='stress')
+                 for i in range(20)]
+        result = {
+            'journal_mode': sqlite.current(connection, ['journal_mode'])['journal_mode'],
+            'reads': 0, 'writes': 0, 'locked': 0, 'failed': 0,
+        }
+        # the worker threads open connections of their own
+        connection.close()
+
+        lock = threading.Lock()
+        ready = threading.Barrier(options['threads'] + 1)
+        deadline = []
+
+        def worker(index):
+            rng = random.Random(index)
+            client = Client()
+            client.force_login(user)
+            counts = {'reads': 0, 'writes': 0, 'locked': 0, 'failed': 0}
+            ready.wait()
+            try:
+                while time.perf_counter() < deadline[0]:
+                    write = rng.random() < options['write_ratio']
+                    try:
+                        if write:
+                            blog = rng.choice(blogs)
+                            response = client.post(
+                                reverse('comment-detail', args=[blog.pk]),
+                                {'comment': f'stress comment from worker {index}'})
+                        else:
+                            response = client.get(reverse('blogs'))
+                    except OperationalError as e:
+                        counts['locked' if 'locked' in str(e) else 'failed'] += 1
+                        continue
+                    if response.status_code >= 400:
+                        counts['failed'] += 1
+                    else:
+                        counts['writes' if write else 'reads'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    for key, value in counts.items():
+                        result[key] += value
+
+        workers = [threading.Thread(target=worker, args=(i,))
+                   for i in range(options['threads'])]
+        for thread in workers:
+            thread.start()
+        deadline.append(time.perf_counter() + options['seconds'])
+        ready.wait()
+        for thread in workers:
+            thread.join()
+        return result
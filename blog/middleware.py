@@ -0,0 +1,54 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    '''
+    Time every request, split into SQL, template rendering and the rest,
+    report the split in a Server-Timing header and add it to the
+    histograms served at /metrics. Goes first in MIDDLEWARE so the total
+    includes the other middleware.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        # queries the async ORM runs in its worker thread still see the
+        # stats, since sync_to_async carries the context variables over
+        stats, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        total = time.perf_counter() - stats.started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.observe(view, stats, total)
+
+        response['Server-Timing'] = (
+            f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} queries", '
+            f'tpl;dur={stats.template_time * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}')
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_sitecounter'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='blog',
+            options={'ordering': ['name', 'blogger_id', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['name', 'blogger', 'id'], name='blog_live_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['blogger', 'name', 'id'], name='blog_live_by_blogger_idx'),
+        ),
+    ]
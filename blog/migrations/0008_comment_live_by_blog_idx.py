@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_blog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['blog', 'date_of_comment', 'id'], name='comment_live_by_blog_idx'),
+        ),
+    ]
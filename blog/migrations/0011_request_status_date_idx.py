@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='requesttobeblogger',
+            index=models.Index(fields=['status', 'request_date'], name='request_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:40
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def stamp_deleted_rows(apps, schema_editor):
+    # rows deleted before deleted_at existed start their retention window now
+    now = timezone.now()
+    apps.get_model('blog', 'Blog').objects.filter(
+        is_deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+    apps.get_model('blog', 'Comments').objects.filter(
+        deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_request_status_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBlog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('blogger_id', models.BigIntegerField(blank=True, null=True)),
+                ('time_of_upload', models.DateTimeField()),
+                ('description', models.TextField(blank=True)),
+                ('date_uploaded', models.DateField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('blog_id', models.BigIntegerField()),
+                ('username_id', models.BigIntegerField(blank=True, null=True)),
+                ('date_of_comment', models.DateTimeField()),
+                ('comment', models.TextField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comments',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at'], name='blog_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(condition=models.Q(('deleted', True)), fields=['deleted_at'], name='comment_deleted_at_idx'),
+        ),
+        migrations.RunPython(stamp_deleted_rows, migrations.RunPython.noop),
+    ]
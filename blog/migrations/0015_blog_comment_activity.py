@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:15
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_activity(apps, schema_editor):
+    # the same numbers as blog.activity.reconcile(), in one statement
+    Blog = apps.get_model('blog', 'Blog')
+    live = apps.get_model('blog', 'Comments').objects.filter(
+        blog=OuterRef('pk'), deleted=False).order_by().values('blog')
+    Blog.objects.update(
+        comment_count=Coalesce(Subquery(live.annotate(count=Count('pk')).values('count')), 0),
+        last_comment_at=Subquery(live.annotate(last=Max('date_of_comment')).values('last')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_blog_description_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-last_comment_at', '-id'], name='blog_live_activity_idx'),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_blog_comment_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-time_of_upload', '-id'], name='blog_live_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['blogger', '-time_of_upload', '-id'], name='blog_live_newest_blogger_idx'),
+        ),
+    ]
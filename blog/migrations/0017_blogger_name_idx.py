@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_blog_newest_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogger',
+            index=models.Index(fields=['last_name', 'first_name'], name='blogger_name_idx'),
+        ),
+    ]
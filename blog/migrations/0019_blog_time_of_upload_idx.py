@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_outboxemail_claim_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['time_of_upload'], name='blog_time_of_upload_idx'),
+        ),
+    ]
@@ -1,11 +1,69 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from datetime import date
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from . import rendering
 # Create your models here.
 
 
-class Blog(models.Model):
+class LiveManager(models.Manager):
+    '''hides the rows that have been soft-deleted'''
+    # the boolean field that marks a row as deleted
+    deleted_field = None
+
+    def get_queryset(self):
+        return super().get_queryset().filter(**{self.deleted_field: False})
+
+
+class LiveBlogManager(LiveManager):
+    deleted_field = 'is_deleted'
+
+
+class LiveCommentsManager(LiveManager):
+    deleted_field = 'deleted'
+
+
+class SoftDeleteMixin:
+    '''
+    soft_delete() and restore() for a model with a live `objects` manager,
+    keeping deleted_at and the counters that skip deleted rows in step
+    with the flag; use these rather than setting the flag by hand
+    '''
+    # more fields the save after a soft delete or restore writes
+    soft_delete_touches = ()
+
+    def soft_delete(self):
+        return self._set_deleted(True)
+
+    def restore(self):
+        return self._set_deleted(False)
+
+    def _set_deleted(self, deleted):
+        field = type(self).objects.deleted_field
+        with transaction.atomic():
+            # flipping the flag in the database first means of two requests
+            # deleting the same row only one gets to adjust the counters
+            changed = type(self).all_objects.filter(
+                pk=self.pk, **{field: not deleted}).update(**{field: deleted})
+            if not changed:
+                setattr(self, field, deleted)
+                return False
+            setattr(self, field, deleted)
+            self.deleted_at = timezone.now() if deleted else None
+            # saved again for the signals that reindex and bump the caches
+            self.save(update_fields=[field, 'deleted_at', *self.soft_delete_touches])
+            self.deleted_changed(deleted)
+        return True
+
+    def deleted_changed(self, deleted):
+        '''update what counts the live rows, in the soft delete's transaction'''
+        raise NotImplementedError
+
+
+class Blog(SoftDeleteMixin, models.Model):
     '''model representing a blog'''
     name = models.CharField(
         max_length=200, help_text='Write the title of your blog here')
@@ -13,12 +71,55 @@ class Blog(models.Model):
         'Blogger', on_delete=models.SET_NULL, null=True)
     time_of_upload = models.DateTimeField(auto_now_add=True)
     description = models.TextField(
-        max_length=2000, help_text='write your blog here', blank=True)
+        max_length=2000, help_text='write your blog here (Markdown)', blank=True)
+    # the description rendered from Markdown when the blog is saved,
+    # and the renderer version that did it (see rendering.py)
+    description_html = models.TextField(blank=True, editable=False)
+    description_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
     date_uploaded = models.DateField(null=True, blank=True)
     is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # when anything shown on the blog's page last changed: the blog
+    # itself, its comments or its blogger (see signals.py and conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
+    # live comments and when the latest was written, shown on the lists
+    # (kept up to date by activity.py)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # the default manager only sees live blogs,
+    # all_objects is there for the admin and maintenance jobs
+    objects = LiveBlogManager()
+    all_objects = models.Manager()
 
     class Meta:
-        ordering = ['name', 'blogger']
+        # blogger_id rather than blogger, so sorting does not join Blogger,
+        # and id last to make the order total for keyset pagination
+        ordering = ['name', 'blogger_id', 'id']
+        indexes = [
+            models.Index(fields=['name', 'blogger', 'id'],
+                         condition=Q(is_deleted=False),
+                         name='blog_live_listing_idx'),
+            models.Index(fields=['blogger', 'name', 'id'],
+                         condition=Q(is_deleted=False),
+                         name='blog_live_by_blogger_idx'),
+            models.Index(fields=['deleted_at'],
+                         condition=Q(is_deleted=True),
+                         name='blog_deleted_at_idx'),
+            # the blog list sorted by recent activity
+            models.Index(fields=['-last_comment_at', '-id'],
+                         condition=Q(is_deleted=False),
+                         name='blog_live_activity_idx'),
+            # the newest blogs, for the feeds
+            models.Index(fields=['-time_of_upload', '-id'],
+                         condition=Q(is_deleted=False),
+                         name='blog_live_newest_idx'),
+            models.Index(fields=['blogger', '-time_of_upload', '-id'],
+                         condition=Q(is_deleted=False),
+                         name='blog_live_newest_blogger_idx'),
+            # the admin's date filter, which also lists deleted blogs
+            models.Index(fields=['time_of_upload'], name='blog_time_of_upload_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,9 +128,40 @@ class Blog(models.Model):
         """Returns the URL to access a detail record for this blog."""
         return reverse('blog-detail', args=[str(self.id)])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        blog = super().from_db(db, field_names, values)
+        # the blogger whose cached pages list the blog, see signals.py
+        blog.saved_blogger_id = blog.__dict__.get('blogger_id')
+        return blog
+
     @property
     def get_comments(self):
-        return Comments.objects.filter(blog=self)
+        return Comments.all_objects.filter(blog=self)
+
+    def render_description(self, changed=True):
+        '''render the description into description_html, before a save'''
+        if changed or self.description_html_version != rendering.RENDERER_VERSION:
+            self.description_html = rendering.render_markdown(self.description)
+            self.description_html_version = rendering.RENDERER_VERSION
+
+    @property
+    def rendered_description(self):
+        if self.description_html_version != rendering.RENDERER_VERSION:
+            # not re-rendered since the renderer changed, or never rendered
+            return mark_safe(rendering.render_markdown(self.description))
+        return mark_safe(self.description_html)
+
+    @classmethod
+    def touch(cls, **filters):
+        '''mark the matching blogs as changed without sending save signals'''
+        return cls.all_objects.filter(**filters).update(updated_at=timezone.now())
+
+    soft_delete_touches = ('updated_at',)
+
+    def deleted_changed(self, deleted):
+        from . import counters
+        counters.increment(counters.BLOGS, -1 if deleted else 1)
 
 
 class Blogger(models.Model):
@@ -45,6 +177,10 @@ class Blogger(models.Model):
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # the blogger list and the admin's blogger autocomplete
+            models.Index(fields=['last_name', 'first_name'], name='blogger_name_idx'),
+        ]
 
     def __str__(self):
         return f'{self.last_name}, {self.first_name}'
@@ -54,7 +190,7 @@ class Blogger(models.Model):
         return reverse('blogger-detail', args=[str(self.id)])
 
 
-class Comments(models.Model):
+class Comments(SoftDeleteMixin, models.Model):
     '''the comments of user's in the miniblog'''
     username = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, blank=False)
@@ -63,9 +199,21 @@ class Comments(models.Model):
         max_length=1000, help_text='write your comments here')
     blog = models.ForeignKey('Blog', on_delete=models.CASCADE)
     deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveCommentsManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ['date_of_comment']
+        indexes = [
+            models.Index(fields=['blog', 'date_of_comment', 'id'],
+                         condition=Q(deleted=False),
+                         name='comment_live_by_blog_idx'),
+            models.Index(fields=['deleted_at'],
+                         condition=Q(deleted=True),
+                         name='comment_deleted_at_idx'),
+        ]
 
     def __str__(self):
 
@@ -76,6 +224,14 @@ class Comments(models.Model):
             string = self.comment
         return string
 
+    def deleted_changed(self, deleted):
+        from . import activity, counters
+        counters.increment(counters.COMMENTS, -1 if deleted else 1)
+        if deleted:
+            activity.comment_removed(self)
+        else:
+            activity.comment_added(self)
+
 
 class RequestToBeBlogger(models.Model):
     '''if a user/reader wants to become a blogger'''
@@ -106,4 +262,83 @@ class RequestToBeBlogger(models.Model):
     class Meta:
         
         ordering = ['request_date']
-        permissions = (('can_approve_request', 'set user as blogger'), )
\ No newline at end of file
+        permissions = (('can_approve_request', 'set user as blogger'), )
+        indexes = [
+            models.Index(fields=['status', 'request_date'],
+                         name='request_status_date_idx'),
+        ]
+
+class SiteCounter(models.Model):
+    '''a live running total, kept up to date so pages never have to COUNT(*)'''
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class OutboxEmail(models.Model):
+    '''an email waiting for the send_outbox worker to deliver it'''
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.TextField(help_text='comma separated addresses')
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # set by the worker that leased the email, see outbox._lease
+    claim_token = models.CharField(max_length=32, blank=True, editable=False)
+
+    email_status = [
+        ('P', 'Pending'),
+        ('S', 'Sent'),
+        ('F', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=1,
+        choices=email_status,
+        default='P',
+        )
+
+    def __str__(self):
+        return f'{self.subject} to {self.recipients}'
+
+    class Meta:
+        ordering = ['send_after', 'id']
+        indexes = [
+            models.Index(fields=['send_after', 'id'],
+                         condition=Q(status='P'),
+                         name='outbox_pending_idx'),
+        ]
+
+
+class ArchivedBlog(models.Model):
+    '''a soft-deleted blog moved out of the hot table by archive_deleted'''
+    original_id = models.BigIntegerField(unique=True)
+    name = models.CharField(max_length=200)
+    blogger_id = models.BigIntegerField(null=True, blank=True)
+    time_of_upload = models.DateTimeField()
+    description = models.TextField(blank=True)
+    date_uploaded = models.DateField(null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ArchivedComment(models.Model):
+    '''a deleted comment, or one of an archived blog, moved out by archive_deleted'''
+    original_id = models.BigIntegerField(unique=True)
+    blog_id = models.BigIntegerField()
+    username_id = models.BigIntegerField(null=True, blank=True)
+    date_of_comment = models.DateTimeField()
+    comment = models.TextField()
+    deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.comment[:75]
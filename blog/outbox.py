@@ -0,0 +1,111 @@
+'''a database-backed outbox for the emails the views send
+
+Views call enqueue()/enqueue_many() inside their own transaction, so a
+message is stored if and only if the change it reports is committed,
+and the request never waits on SMTP. `manage.py send_outbox` drains the
+table in batches over a single reused connection, retrying failures
+with exponential backoff.
+'''
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+# the first retry waits this long, every later one twice as long as the last
+RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', timedelta(minutes=1))
+MAX_RETRY_DELAY = getattr(settings, 'OUTBOX_MAX_RETRY_DELAY', timedelta(hours=6))
+# how long a batch is reserved for the worker that picked it up
+LEASE = timedelta(minutes=10)
+
+
+def enqueue(subject, message, from_email, recipient_list):
+    '''queue one email, taking the same arguments as send_mail'''
+    return OutboxEmail.objects.create(
+        subject=subject, body=message, from_email=from_email or '',
+        recipients=','.join(recipient_list))
+
+
+def enqueue_many(datatuple):
+    '''queue several emails, taking the same tuples as send_mass_mail'''
+    return OutboxEmail.objects.bulk_create([
+        OutboxEmail(subject=subject, body=message, from_email=from_email or '',
+                    recipients=','.join(recipient_list))
+        for subject, message, from_email, recipient_list in datatuple])
+
+
+def retry_delay(attempts):
+    # the exponent is capped so large attempt counts can't overflow timedelta
+    return min(RETRY_DELAY * 2 ** min(attempts - 1, 20), MAX_RETRY_DELAY)
+
+
+def _due_ids(batch_size, now):
+    return list(OutboxEmail.objects.filter(status='P', send_after__lte=now)
+                .values_list('id', flat=True)[:batch_size])
+
+
+def _lease(ids, now):
+    '''
+    Reserve the emails among ids that are still due and return them.
+
+    Another worker may have picked the same ids, so the UPDATE checks
+    again that they are due and stamps them with a token of this
+    worker's; pushing send_after into the future then makes the check
+    fail for everyone else, and only the rows carrying the token are
+    ours to send.
+    '''
+    token = uuid.uuid4().hex
+    OutboxEmail.objects.filter(id__in=ids, status='P', send_after__lte=now).update(
+        send_after=now + LEASE, claim_token=token)
+    return list(OutboxEmail.objects.filter(claim_token=token))
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    ids = _due_ids(batch_size, now)
+    if not ids:
+        return []
+    return _lease(ids, now)
+
+
+def send_batch(batch_size=100):
+    '''deliver up to batch_size due emails and return (sent, failed)'''
+    emails = _claim(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    connection.open()
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body,
+                email.from_email or settings.DEFAULT_FROM_EMAIL,
+                email.recipients.split(','), connection=connection)
+            email.attempts += 1
+            try:
+                message.send()
+            except Exception as error:
+                failed += 1
+                email.last_error = f'{type(error).__name__}: {error}'
+                if email.attempts >= MAX_ATTEMPTS:
+                    email.status = 'F'
+                else:
+                    email.send_after = timezone.now() + retry_delay(email.attempts)
+            else:
+                sent += 1
+                email.status = 'S'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+            email.claim_token = ''
+    finally:
+        connection.close()
+
+    OutboxEmail.objects.bulk_update(
+        emails, ['status', 'attempts', 'send_after', 'sent_at', 'last_error', 'claim_token'])
+    return sent, failed
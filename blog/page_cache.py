@@ -0,0 +1,146 @@
+'''whole-page cache for anonymous readers of the public listings
+
+Rendered pages are stored under keys that embed version numbers: one
+for the global blog list and one per blogger. Saving or deleting a Blog
+or Blogger bumps the versions it affects (see signals.py), so later
+requests build new keys and never see a stale page. The old entries
+simply age out of the cache. Only the cache API is used (get/set/incr),
+so it works the same on the locmem and file-based backends.
+'''
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+# a version key that expires just starts over at a fresh version, this
+# only frees the keys of bloggers nobody asks for, or that don't exist
+VERSION_TIMEOUT = getattr(settings, 'PAGE_VERSION_TIMEOUT', 24 * 3600)
+
+LIST = 'list'
+# the syndication feeds, see feeds.py
+FEED = 'feed'
+HITS_KEY = 'blog:page-cache:hits'
+MISSES_KEY = 'blog:page-cache:misses'
+
+
+def blogger_version(blogger_id):
+    return f'blogger:{blogger_id}'
+
+
+def feed_blogger_version(blogger_id):
+    return f'feed:blogger:{blogger_id}'
+
+
+def _version_key(name):
+    return f'blog:page-version:{name}'
+
+
+def _fresh_version():
+    # when a version key is evicted it must not restart at a number an
+    # older, still cached page was stored under
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+async def aget_versions(names):
+    keys = [_version_key(name) for name in names]
+    found = await cache.aget_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, VERSION_TIMEOUT)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def page_key(view_name, versions, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    tag = '.'.join(str(version) for version in versions)
+    return f'blog:page:{view_name}:{tag}:{path}'
+
+
+def bump(*names):
+    '''invalidate every page built from the named versions, after commit'''
+    def _bump():
+        for name in names:
+            try:
+                cache.incr(_version_key(name))
+            except ValueError:
+                cache.set(_version_key(name), _fresh_version(), VERSION_TIMEOUT)
+    transaction.on_commit(_bump)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+class VersionedPageCacheMixin:
+    '''
+    Serves GET requests from anonymous users out of the cache.
+
+    Views list the versions their output depends on in
+    get_cache_versions(); logged in users always get a fresh page since
+    the sidebar is personal.
+    '''
+
+    def get_cache_versions(self):
+        return [LIST]
+
+    def get_page_cache_key(self, request):
+        versions = get_versions(self.get_cache_versions())
+        return page_key(self.__class__.__name__, versions, request)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            _count(HITS_KEY)
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        _count(MISSES_KEY)
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code == 200:
+            cache.set(key, (response.content, response['Content-Type']),
+                      CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,454 @@
+'''keyset (cursor) pagination for the list views
+
+Django's Paginator pages with OFFSET, so page N has to scan and throw
+away every row before it, and every page also pays for a COUNT(*).
+CursorPaginator instead remembers the sort key of the last row it showed
+and asks for the rows after it, which an index can answer directly no
+matter how deep the page is.
+'''
+import base64
+import binascii
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+
+# above this many rows EstimatedCountPaginator stops counting exactly
+ESTIMATED_COUNT_THRESHOLD = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10000)
+ESTIMATED_COUNT_TIMEOUT = getattr(settings, 'ESTIMATED_COUNT_TIMEOUT', 300)
+# how old HasNextPaginator's approximate total may get before it is recounted
+APPROXIMATE_COUNT_REFRESH = getattr(settings, 'APPROXIMATE_COUNT_REFRESH', 300)
+
+
+def _json_default(value):
+    # keep full precision so the key compares equal to the stored value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    '''one page of rows plus the cursors leading to its neighbours'''
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} rows>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    '''
+    Pages through a queryset ordered by a unique key.
+
+    ordering is a list of field names (optionally prefixed with '-') whose
+    last entry must make the order total, e.g. ('name', 'blogger_id', 'id').
+    Nullable fields sort NULLs first when ascending and last when
+    descending, whatever the database default is.
+    '''
+    query_param = 'cursor'
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.descending = [name.startswith('-') for name in ordering]
+        opts = queryset.model._meta
+        self.model_fields = [
+            opts.get_field(name[:-3] if name.endswith('_id') else name)
+            for name in self.fields]
+        self.nullable = [field.null for field in self.model_fields]
+
+    def _order_by(self, reverse=False):
+        order = []
+        for field, descending in zip(self.fields, self.descending):
+            if descending != reverse:
+                order.append(F(field).desc(nulls_last=True))
+            else:
+                order.append(F(field).asc(nulls_first=True))
+        return order
+
+    def _beyond(self, index, value, forward):
+        '''rows whose value of fields[index] sorts strictly after value'''
+        field = self.fields[index]
+        if forward:
+            if value is None:
+                return Q(**{f'{field}__isnull': False})
+            return Q(**{f'{field}__gt': value})
+        if value is None:
+            return None
+        condition = Q(**{f'{field}__lt': value})
+        if self.nullable[index]:
+            condition |= Q(**{f'{field}__isnull': True})
+        return condition
+
+    def _after_columns(self, key, reverse, start):
+        '''rows that tie with key before fields[start] and sort after it from there'''
+        condition = Q(pk__in=[])
+        equal = Q()
+        for index in range(start, len(key)):
+            value = key[index]
+            forward = self.descending[index] == reverse
+            beyond = self._beyond(index, value, forward)
+            if beyond is not None:
+                condition |= equal & beyond
+            field = self.fields[index]
+            if value is None:
+                equal &= Q(**{f'{field}__isnull': True})
+            else:
+                equal &= Q(**{field: value})
+        return condition
+
+    def _after(self, key, reverse=False):
+        '''
+        Filters for the rows that sort after key, or before it if reverse,
+        as a list of segments to read one after the other. Each is a range
+        on the leading column that an index can seek to; a nullable leading
+        column is split into its non-NULL and NULL rows for that, since an
+        OR with IS NULL makes the database scan from the start instead.
+        '''
+        first, value = self.fields[0], key[0]
+        # which way the walk goes on the leading column, see _order_by()
+        downwards = self.descending[0] != reverse
+        if not self.nullable[0]:
+            bound = Q(**{f'{first}__{"lte" if downwards else "gte"}': value})
+            return [bound & self._after_columns(key, reverse, 0)]
+
+        rest = self._after_columns(key, reverse, 1)
+        if value is None:
+            # NULLs come last going down and first going up
+            segments = [Q(**{f'{first}__isnull': True}) & rest]
+            if not downwards:
+                segments.append(Q(**{f'{first}__isnull': False}))
+            return segments
+        bound = Q(**{f'{first}__{"lte" if downwards else "gte"}': value})
+        beyond = Q(**{f'{first}__{"lt" if downwards else "gt"}': value})
+        segments = [bound & (beyond | (Q(**{first: value}) & rest))]
+        if downwards:
+            segments.append(Q(**{f'{first}__isnull': True}))
+        return segments
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [getattr(row, field) for field in self.fields]
+
+    def encode_cursor(self, direction, row):
+        payload = json.dumps([direction, self._key(row)], default=_json_default)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, key = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError, binascii.Error):
+            raise InvalidCursor(cursor)
+        if direction not in ('n', 'p') or not isinstance(key, list) \
+                or len(key) != len(self.fields):
+            raise InvalidCursor(cursor)
+        # a tampered cursor can be well formed and still hold values the
+        # fields can't take, which would fail while the filter is built
+        try:
+            key = [field.to_python(value) for field, value in zip(self.model_fields, key)]
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if any(value is None and not nullable
+               for value, nullable in zip(key, self.nullable)):
+            raise InvalidCursor(cursor)
+        return direction, key
+
+    def _rows_queries(self, cursor):
+        '''
+        The queries for the page a cursor points to, to run in turn until
+        the page is full, and whether they run backwards.
+        '''
+        if not cursor:
+            return [self.queryset.order_by(*self._order_by())], False
+        direction, key = self.decode_cursor(cursor)
+        reverse = direction == 'p'
+        order = self._order_by(reverse)
+        return [self.queryset.filter(segment).order_by(*order)
+                for segment in self._after(key, reverse)], reverse
+
+    def _make_page(self, rows, cursor, reverse):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not cursor:
+            has_next, has_previous = more, False
+        elif reverse:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, True
+
+        if not rows:
+            return CursorPage(rows, self)
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode_cursor('n', rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor('p', rows[0]) if has_previous else None,
+        )
+
+    def page(self, cursor=None):
+        '''return the CursorPage that the given cursor points to'''
+        queries, reverse = self._rows_queries(cursor)
+        rows = []
+        for query in queries:
+            # one more row than the page shows, to tell if there is another
+            rows += query[:self.per_page + 1 - len(rows)]
+            if len(rows) > self.per_page:
+                break
+        return self._make_page(rows, cursor, reverse)
+
+    async def apage(self, cursor=None):
+        '''page(), fetching the rows with the async ORM'''
+        queries, reverse = self._rows_queries(cursor)
+        rows = []
+        for query in queries:
+            rows += [row async for row in query[:self.per_page + 1 - len(rows)]]
+            if len(rows) > self.per_page:
+                break
+        return self._make_page(rows, cursor, reverse)
+
+
+class CursorPaginationMixin:
+    '''
+    Swaps a ListView over to keyset pagination.
+
+    Old ?page=N links still work through the regular paginator, so the
+    switch does not break bookmarks.
+    '''
+    cursor_ordering = None
+
+    def get_cursor_ordering(self):
+        if self.cursor_ordering is not None:
+            return self.cursor_ordering
+        return list(self.model._meta.ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.kwargs or self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering())
+        try:
+            page = paginator.page(self.request.GET.get(paginator.query_param))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+def _numbered_page(queryset, per_page, number, approximate=False):
+    '''a ?page=N page, with its rows fetched'''
+    paginator = HasNextPaginator(queryset, per_page, approximate=approximate)
+    try:
+        page = paginator.page(paginator.num_pages if number == 'last' else int(number))
+    except (ValueError, InvalidPage):
+        raise Http404('Invalid page.')
+    page.object_list = list(page.object_list)
+    return paginator, page
+
+
+async def apaginate(request, queryset, per_page, ordering, approximate=False):
+    '''
+    The pagination part of a ListView context, for async views, with the
+    same ?page=N fallback as CursorPaginationMixin.
+    '''
+    if 'page' in request.GET:
+        paginator, page = await sync_to_async(_numbered_page)(
+            queryset, per_page, request.GET['page'], approximate)
+    else:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        try:
+            page = await paginator.apage(request.GET.get(paginator.query_param))
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+    return {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list,
+    }
+
+
+def _count_key(queryset, kind='count'):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(repr((sql, params)).encode()).hexdigest()
+    return f'blog:{kind}:{queryset.model._meta.label_lower}:{digest}'
+
+
+class EstimatedCountPaginator(Paginator):
+    '''
+    A Paginator for tables too big to COUNT(*) on every page view, such
+    as the admin's changelists.
+
+    Up to threshold rows are counted exactly, by a COUNT that stops
+    reading after threshold + 1 rows. Beyond that the queryset is
+    counted in full once and the result cached for ESTIMATED_COUNT_TIMEOUT
+    seconds, so the page links may be a little stale, which the admin
+    copes with. (The primary key range is no estimate: deleted rows and
+    imports leave gaps in the ids.)
+    '''
+    threshold = ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        queryset = self.object_list.order_by()
+        key = _count_key(queryset)
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+        counted = queryset[:self.threshold + 1].count()
+        if counted <= self.threshold:
+            # cheap enough to count afresh each time, and never stale
+            return counted
+        count = queryset.count()
+        cache.set(key, count, ESTIMATED_COUNT_TIMEOUT)
+        return count
+
+
+def _in_background(function):
+    '''run function in a thread of its own, which closes its connections after'''
+    def run():
+        try:
+            function()
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, daemon=True).start()
+
+
+class HasNextPage(Page):
+    '''a page of HasNextPaginator, which knows whether another follows'''
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def __repr__(self):
+        return f'<Page {self.number}>'
+
+    def has_next(self):
+        return self.more
+
+    def start_index(self):
+        return (self.paginator.per_page * (self.number - 1)) + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+    @property
+    def approximate_pages(self):
+        '''about how many pages there are, None unless the paginator has a total'''
+        total = self.paginator.approximate_count
+        if total is None:
+            return None
+        pages = math.ceil(max(total - self.paginator.orphans, 1) / self.paginator.per_page)
+        # the total is a little old, the rows in hand are not
+        return max(pages, self.number + self.more)
+
+
+class HasNextPaginator(Paginator):
+    '''
+    Numbered pages without the COUNT(*).
+
+    A page fetches per_page + 1 rows (plus orphans) and the extra row
+    only tells whether a next page exists, so templates should use
+    page_obj.has_next rather than paginator.num_pages. count and
+    num_pages still work, by counting, for templates and callers (like
+    ListView's ?page=last) that insist on them.
+
+    With approximate=True, paginator.approximate_count is a total kept
+    in the cache, recounted in a background thread once it is older than
+    APPROXIMATE_COUNT_REFRESH seconds while requests keep getting the old
+    value. It is None until the first count finishes.
+    '''
+    # lets templates tell it apart from a Paginator that counted
+    skips_count = True
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 approximate=False):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.approximate = approximate
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + self.orphans + 1])
+        more = len(rows) > self.per_page + self.orphans
+        if more:
+            rows = rows[:self.per_page]
+        if not rows and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return HasNextPage(rows, number, self, more)
+
+    @cached_property
+    def approximate_count(self):
+        if not self.approximate or not isinstance(self.object_list, QuerySet):
+            return None
+        queryset = self.object_list.order_by()
+        key = _count_key(queryset, 'approximate-count')
+        found = cache.get(key)
+        if found is None or time.time() - found[1] > APPROXIMATE_COUNT_REFRESH:
+            # one recount at a time per query, across processes
+            if cache.add(f'{key}:refreshing', True, APPROXIMATE_COUNT_REFRESH):
+                def recount():
+                    try:
+                        # kept well past the refresh, a query nobody pages
+                        # through any more can drop out in the end
+                        cache.set(key, (queryset.count(), time.time()),
+                                  APPROXIMATE_COUNT_REFRESH * 100)
+                    finally:
+                        cache.delete(f'{key}:refreshing')
+                _in_background(recount)
+        return found[0] if found is not None else None
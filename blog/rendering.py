@@ -0,0 +1,157 @@
+'''Markdown for blog descriptions, rendered once when a blog is saved
+
+Blog.description holds what the blogger typed; description_html holds
+the rendered HTML together with the RENDERER_VERSION that produced it,
+so showing a blog costs nothing extra. Bump RENDERER_VERSION whenever
+the output of render_markdown changes and run
+
+    python manage.py render_descriptions
+
+to re-render the rows that are now stale. Until then those rows are
+rendered on the fly (see Blog.rendered_description).
+
+The supported Markdown is a small, common subset: paragraphs, # headings,
+> quotes, - and 1. lists, --- rules, fenced code blocks, `code`, **bold**,
+*italics* and [links](https://example.com). The input is HTML-escaped
+before any of it is turned into tags, so the only markup in the output
+is the markup generated here, and links only accept http(s), mailto and
+site-relative URLs.
+'''
+import html
+import re
+
+RENDERER_VERSION = 2
+
+_FENCE = re.compile(r'^(```|~~~)')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_RULE = re.compile(r'^\s{0,3}([-*_])(\s*\1){2,}\s*$')
+_QUOTE = re.compile(r'^\s{0,3}>\s?')
+_BULLET = re.compile(r'^\s{0,3}[-*+]\s+')
+_NUMBER = re.compile(r'^\s{0,3}\d{1,9}[.)]\s+')
+
+_CODE_SPAN = re.compile(r'`([^`]+)`')
+_LINK = re.compile(r'\[([^\]]+)\]\(([^)\s]+)\)')
+_STRONG = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+_EMPHASIS = re.compile(r'(?<![\w*])([*_])(?=\S)(.+?)(?<=\S)\1(?![\w*])')
+_SAFE_URL = re.compile(r'^(https?:|mailto:|/|#)', re.IGNORECASE)
+# what a browser ignores inside a URL scheme, e.g. java\tscript:
+_IGNORED_IN_URL = re.compile(r'[\x00-\x20]')
+
+
+def _emphasis(text):
+    text = _STRONG.sub(r'<strong>\2</strong>', text)
+    return _EMPHASIS.sub(r'<em>\2</em>', text)
+
+
+def _inline(text):
+    '''escape a run of text and apply the inline markup'''
+    text = html.escape(text)
+    # code spans and links are taken out first so nothing inside them,
+    # URLs included, is formatted
+    spans = []
+
+    def stash(markup):
+        spans.append(markup)
+        return f'\x00{len(spans) - 1}\x00'
+
+    def link(match):
+        text, url = match.group(1), match.group(2)
+        if not _SAFE_URL.match(_IGNORED_IN_URL.sub('', html.unescape(url))):
+            return match.group(0)
+        # url is already escaped, quotes included
+        return stash(f'<a href="{url}" rel="nofollow">{_emphasis(text)}</a>')
+
+    text = _CODE_SPAN.sub(lambda match: stash(f'<code>{match.group(1)}</code>'), text)
+    text = _LINK.sub(link, text)
+    text = _emphasis(text)
+    # links can hold code spans, so restore until none are left
+    while '\x00' in text:
+        text = re.sub('\x00(\\d+)\x00', lambda m: spans[int(m.group(1))], text)
+    return text
+
+
+def _list(lines, marker, tag):
+    items = []
+    for line in lines:
+        if marker.match(line):
+            items.append(marker.sub('', line))
+        else:
+            # a continuation of the previous item
+            items[-1] += ' ' + line.strip()
+    body = ''.join(f'<li>{_inline(item)}</li>' for item in items)
+    return f'<{tag}>{body}</{tag}>'
+
+
+def _kind(line):
+    '''the kind of block a line starts, None for plain text'''
+    if _FENCE.match(line) or _HEADING.match(line) or _RULE.match(line):
+        return 'single'
+    if _QUOTE.match(line):
+        return 'quote'
+    if _BULLET.match(line):
+        return 'ul'
+    if _NUMBER.match(line):
+        return 'ol'
+    return None
+
+
+def _blocks(lines):
+    out = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        fence = _FENCE.match(line)
+        if fence:
+            end = i + 1
+            while end < len(lines) and not lines[end].startswith(fence.group(1)):
+                end += 1
+            code = html.escape('\n'.join(lines[i + 1:end]))
+            out.append(f'<pre><code>{code}</code></pre>')
+            i = end + 1
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(heading.group(1))
+            out.append(f'<h{level}>{_inline(heading.group(2))}</h{level}>')
+            i += 1
+            continue
+
+        if _RULE.match(line):
+            out.append('<hr>')
+            i += 1
+            continue
+
+        # the remaining blocks run until a blank line or another kind of block
+        kind = _kind(line)
+        end = i + 1
+        while end < len(lines) and lines[end].strip() and _kind(lines[end]) in (kind, None):
+            end += 1
+        block = lines[i:end]
+        i = end
+
+        if kind == 'quote':
+            inner = _blocks([_QUOTE.sub('', quoted) for quoted in block])
+            out.append(f'<blockquote>{inner}</blockquote>')
+        elif kind == 'ul':
+            out.append(_list(block, _BULLET, 'ul'))
+        elif kind == 'ol':
+            out.append(_list(block, _NUMBER, 'ol'))
+        else:
+            out.append(f"<p>{_inline(' '.join(part.strip() for part in block))}</p>")
+    return ''.join(out)
+
+
+def render_markdown(text):
+    '''the sanitized HTML for a Markdown text'''
+    text = (text or '').replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '')
+    return _blocks(text.split('\n'))
+
+
+def render_batch(rows):
+    '''[(id, description)] -> [(id, description, html)], for worker processes'''
+    return [(pk, description, render_markdown(description)) for pk, description in rows]
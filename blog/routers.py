@@ -0,0 +1,118 @@
+'''send reads to replica databases and writes to the primary
+
+DATABASE_REPLICAS maps replica aliases to integer weights, and reads
+are spread over them in weighted round-robin order. Everything else
+stays on 'default', the primary:
+
+* writes, and reads inside a transaction on the primary;
+* every query of a request that is not a GET/HEAD, or that has written;
+* every query for a short while after a visitor wrote something, so
+  that e.g. the blog page shown after posting a comment includes it
+  even if the replicas lag behind. ReplicaPinningMiddleware remembers
+  this in a cookie for REPLICA_PIN_SECONDS;
+* anything that runs outside a request, such as management commands.
+'''
+import itertools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'blog_pin_primary'
+
+# per-request routing state, None outside a request
+_state = ContextVar('blog_db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def get_replicas():
+    replicas = getattr(settings, 'DATABASE_REPLICAS', None) or {}
+    if not isinstance(replicas, dict):
+        replicas = {alias: 1 for alias in replicas}
+    return replicas
+
+
+class PrimaryReplicaRouter:
+    def __init__(self):
+        # weighted round-robin schedules, one per replica configuration
+        self._schedules = {}
+
+    def _next_replica(self, replicas):
+        key = tuple(sorted(replicas.items()))
+        schedule = self._schedules.get(key)
+        if schedule is None:
+            schedule = self._schedules[key] = itertools.cycle(
+                [alias for alias, weight in key for _ in range(weight)])
+        return next(schedule)
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        state = _state.get()
+        if (not replicas or state is None or state.pinned or state.wrote
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return self._next_replica(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaPinningMiddleware:
+    '''
+    Track the routing state of each request for PrimaryReplicaRouter,
+    and pin the visitor to the primary for a while after they write.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        state = RoutingState(
+            pinned=request.method not in ('GET', 'HEAD')
+            or PIN_COOKIE in request.COOKIES)
+        return state, _state.set(state)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        if state.wrote or request.method not in ('GET', 'HEAD'):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,142 @@
+'''full-text search over blog titles and bodies
+
+On SQLite the live blogs are mirrored into an FTS5 virtual table
+(created in migration 0009) keyed by the blog id, so a search is an
+index lookup ranked with bm25 instead of a LIKE scan over every
+description. The mirror is kept current from the Blog signals in
+signals.py and can be rebuilt with `manage.py rebuild_search_index`.
+Other databases fall back to a plain icontains filter.
+'''
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Blog
+
+FTS_TABLE = 'blog_blog_fts'
+
+# a match in the title counts for more than one in the body
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# highlights are marked with two control characters before the text is
+# escaped; a form, the API or an import can still store them, so they
+# are dropped from everything that goes into the index
+_START, _END = '\x02', '\x03'
+_UNMARKED = str.maketrans('', '', _START + _END)
+
+
+def _unmarked(text):
+    return text.translate(_UNMARKED)
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index_blog(blog):
+    '''(re)index one blog, or drop it from the index if it was deleted'''
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [blog.pk])
+        if not blog.is_deleted:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                'VALUES (%s, %s, %s)',
+                [blog.pk, _unmarked(blog.name), _unmarked(blog.description)])
+
+
+def index_new_blogs(blogs):
+    '''index blogs that were created without their signals, e.g. by bulk_create'''
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [(blog.pk, _unmarked(blog.name), _unmarked(blog.description))
+             for blog in blogs if not blog.is_deleted])
+
+
+def unindex_blog(blog_id):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [blog_id])
+
+
+def rebuild():
+    '''repopulate the index from blog_blog and return how many rows it holds'''
+    if not enabled():
+        return 0
+    table = Blog._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+            f"SELECT id, replace(replace(name, char(2), ''), char(3), ''), "
+            f"replace(replace(description, char(2), ''), char(3), '') "
+            f'FROM {table} WHERE NOT is_deleted')
+        count = cursor.rowcount
+        # merge the index b-trees so later queries touch fewer pages
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def to_match_expression(query):
+    '''turn free text into an FTS5 query that matches every word'''
+    terms = [_unmarked(term).replace('"', '') for term in query.split()]
+    return ' '.join(f'"{term}"' for term in terms if term)
+
+
+def matching(query):
+    '''a filter for the blogs matching query, unranked, e.g. for the admin'''
+    expression = to_match_expression(query)
+    if not expression:
+        return Q()
+    if not enabled():
+        return Q(name__icontains=query) | Q(description__icontains=query)
+    return Q(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]))
+
+
+def _highlighted(text):
+    return mark_safe(
+        escape(text).replace(_START, '<mark>').replace(_END, '</mark>'))
+
+
+def search(query, offset=0, limit=10):
+    '''
+    Return up to limit results, best first, as dicts holding the blog
+    and HTML-safe title and snippet strings with the matches marked.
+    '''
+    expression = to_match_expression(query)
+    if not expression:
+        return []
+
+    if not enabled():
+        blogs = Blog.objects.filter(
+            Q(name__icontains=query) | Q(description__icontains=query))
+        return [
+            {'blog': blog, 'title': escape(blog.name),
+             'snippet': escape(blog.description[:200])}
+            for blog in blogs.select_related('blogger')[offset:offset + limit]]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, '
+            f"highlight({FTS_TABLE}, 0, char(2), char(3)), "
+            f"snippet({FTS_TABLE}, 1, char(2), char(3), '…', 24) "
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s OFFSET %s',
+            [expression, TITLE_WEIGHT, BODY_WEIGHT, limit, offset])
+        rows = cursor.fetchall()
+
+    blogs = Blog.objects.select_related('blogger').in_bulk(
+        [row[0] for row in rows])
+    return [
+        {'blog': blogs[pk], 'title': _highlighted(title),
+         'snippet': _highlighted(snippet)}
+        for pk, title, snippet in rows if pk in blogs]
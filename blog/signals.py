@@ -0,0 +1,130 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, metrics, page_cache, search, sqlite
+from .models import Blog, Blogger, Comments
+
+
+@receiver(post_save, sender=Blog)
+def blog_saved(sender, instance, created, **kwargs):
+    if created and not instance.is_deleted:
+        counters.increment(counters.BLOGS)
+
+
+@receiver(post_delete, sender=Blog)
+def blog_deleted(sender, instance, **kwargs):
+    if not instance.is_deleted:
+        counters.increment(counters.BLOGS, -1)
+
+
+@receiver(post_save, sender=Blogger)
+def blogger_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(counters.BLOGGERS)
+
+
+@receiver(post_delete, sender=Blogger)
+def blogger_deleted(sender, instance, **kwargs):
+    counters.increment(counters.BLOGGERS, -1)
+
+
+@receiver(post_save, sender=Comments)
+def comment_saved(sender, instance, created, **kwargs):
+    if created and not instance.deleted:
+        counters.increment(counters.COMMENTS)
+
+
+@receiver(post_delete, sender=Comments)
+def comment_deleted(sender, instance, **kwargs):
+    if not instance.deleted:
+        counters.increment(counters.COMMENTS, -1)
+
+
+@receiver(post_save, sender=Comments)
+@receiver(post_delete, sender=Comments)
+def comment_changed(sender, instance, **kwargs):
+    # the blog's page lists its comments
+    if instance.blog_id is not None:
+        Blog.touch(pk=instance.blog_id)
+
+
+@receiver(post_save, sender=Blogger)
+def blogger_changed(sender, instance, created, **kwargs):
+    # the blogger's name is shown on each of their blogs
+    if not created:
+        Blog.touch(blogger=instance)
+
+
+@receiver(post_save, sender=Blog)
+def blog_search_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'name', 'description', 'is_deleted'} & set(update_fields):
+        return
+    search.index_blog(instance)
+
+
+@receiver(post_delete, sender=Blog)
+def blog_search_deleted(sender, instance, **kwargs):
+    search.unindex_blog(instance.pk)
+
+
+def _bloggers(blog):
+    '''the blogger a blog belongs to and, when it was moved, the one it left'''
+    ids = {blog.blogger_id, getattr(blog, 'saved_blogger_id', blog.blogger_id)}
+    ids.discard(None)
+    return ids
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def blog_page_cache_changed(sender, instance, **kwargs):
+    page_cache.bump(page_cache.LIST, *(
+        page_cache.blogger_version(pk) for pk in _bloggers(instance)))
+
+
+@receiver(post_save, sender=Blogger)
+@receiver(post_delete, sender=Blogger)
+def blogger_page_cache_changed(sender, instance, **kwargs):
+    # the blog list shows blogger names too
+    page_cache.bump(page_cache.LIST, page_cache.blogger_version(instance.pk))
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def blog_feed_changed(sender, instance, **kwargs):
+    # creating, editing and soft-deleting a blog all save it, comments
+    # don't show in the feeds so they leave them cached
+    page_cache.bump(page_cache.FEED, *(
+        page_cache.feed_blogger_version(pk) for pk in _bloggers(instance)))
+
+
+@receiver(post_save, sender=Blogger)
+@receiver(post_delete, sender=Blogger)
+def blogger_feed_changed(sender, instance, **kwargs):
+    # the feeds name the author of each post
+    page_cache.bump(page_cache.FEED, page_cache.feed_blogger_version(instance.pk))
+
+
+@receiver(post_save, sender=Blog)
+def blog_blogger_saved(sender, instance, **kwargs):
+    # connected after the receivers above, which need the blogger it left
+    instance.saved_blogger_id = instance.blogger_id
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # connection_created fires again on reconnect, the wrapper list doesn't reset
+    if metrics.sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.sql_wrapper)
+
+
+@receiver(post_save, sender=Blog)
+def blog_blogger_saved(sender, instance, **kwargs):
+    # connected after the receivers above, which need the blogger it left
+    instance.saved_blogger_id = instance.blogger_id
+
+
+@receiver(connection_created)
+def sqlite_connection_created(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        sqlite.configure(connection)
@@ -0,0 +1,40 @@
+'''per-connection tuning for running the site on SQLite
+
+Django opens SQLite with the library defaults: a rollback journal, so
+a writer blocks every reader, and a full fsync on every commit. The
+SQLITE_PRAGMAS setting lists pragmas to run on each new connection
+instead (see the connection_created receiver in signals.py). WAL mode
+lets the listings keep reading while a comment is written, and
+busy_timeout makes a writer wait for the lock rather than fail with
+"database is locked".
+'''
+from django.conf import settings
+
+
+def _literal(value):
+    if isinstance(value, int):
+        return str(value)
+    value = str(value)
+    if not value.isidentifier():
+        raise ValueError(f'unexpected SQLite pragma value {value!r}')
+    return value
+
+
+def configure(connection):
+    '''run the configured pragmas on a freshly opened SQLite connection'''
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not name.isidentifier():
+                raise ValueError(f'unexpected SQLite pragma {name!r}')
+            cursor.execute(f'PRAGMA {name} = {_literal(value)}')
+
+
+def current(connection, names):
+    '''read back the given pragmas, as a {name: value} dict'''
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
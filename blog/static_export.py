@@ -0,0 +1,210 @@
+'''render the public pages to plain HTML files for a CDN or nginx
+
+Each page gets a fingerprint, an md5 of exactly the rows it shows, which
+is cheap to compute for the whole site with a few streaming queries.
+The export keeps a manifest of the fingerprints it wrote, so the next
+run only renders pages whose rows changed, removes pages that no longer
+exist, and starts over when a template changes.
+
+Files mirror the URLs: /blog/blogs/ becomes blog/blogs/index.html,
+/blog/blogs/7 becomes blog/blogs/7.html and /blog/blogs/?page=3 becomes
+blog/blogs/page-3.html. For nginx, roughly:
+
+    location /blog/ {
+        try_files $uri/page-$arg_page.html $uri.html $uri/index.html @django;
+    }
+'''
+import hashlib
+import json
+import os
+from itertools import groupby
+
+import django
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.http import HttpRequest
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+
+from .models import Blog, Blogger, Comments
+from .pagination import CursorPaginator
+from .views import BLOGS_PER_PAGE, COMMENT_ORDERING, COMMENTS_PER_PAGE, live_comments
+
+MANIFEST = 'manifest.json'
+
+# every template the exported pages are built from
+TEMPLATES = ['base_temp.html', 'blog/blog_list.html', 'blog/blogs_by_blogger.html',
+             'blog/blog_activity.html', 'blog/blog_detail.html', 'blog/comment_list.html']
+
+LIST = 'list'
+DETAIL = 'detail'
+BLOGGER = 'blogger'
+
+
+def _digest(*parts):
+    return hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def file_for(url, page=1):
+    '''the path, relative to the export directory, that serves url'''
+    path = url.lstrip('/')
+    if page > 1:
+        return f'{path}page-{page}.html'
+    if not path or path.endswith('/'):
+        return f'{path}index.html'
+    return f'{path}.html'
+
+
+def templates_fingerprint():
+    sources = []
+    for name in TEMPLATES:
+        with open(get_template(name).origin.name, encoding='utf-8') as f:
+            sources.append(f.read())
+    return _digest(sources)
+
+
+def _pages(rows, per_page):
+    '''split rows into numbered pages the way Paginator does'''
+    pages = [rows[i:i + per_page] for i in range(0, len(rows), per_page)] or [[]]
+    return list(enumerate(pages, start=1))
+
+
+def plan():
+    '''
+    {file: (kind, argument, fingerprint)} for every page the export should
+    contain, from a single pass over the blogs, bloggers and comments.
+    '''
+    pages = {}
+
+    # the blog list, in its display order
+    listing = list(Blog.objects.values_list(
+        'id', 'name', 'blogger__first_name', 'blogger__last_name',
+        'comment_count', 'last_comment_at'))
+    numbered = _pages(listing, BLOGS_PER_PAGE)
+    for number, rows in numbered:
+        pages[file_for(reverse('blogs'), number)] = (
+            LIST, (number, len(listing), [row[0] for row in rows]),
+            _digest(rows, len(numbered)))
+
+    # each blogger's page of blogs
+    blogs_by_blogger = {}
+    for blog_id, blogger_id, *shown in Blog.objects.values_list(
+            'id', 'blogger_id', 'name', 'date_uploaded', 'comment_count', 'last_comment_at'):
+        blogs_by_blogger.setdefault(blogger_id, []).append((blog_id, *shown))
+    for blogger in Blogger.objects.values(
+            'id', 'first_name', 'last_name', 'bio', 'user__username'):
+        blogs = blogs_by_blogger.get(blogger['id'], [])
+        numbered = _pages(blogs, BLOGS_PER_PAGE)
+        url = reverse('blogs-by-blogger', args=[blogger['id']])
+        for number, rows in numbered:
+            pages[file_for(url, number)] = (
+                BLOGGER, (blogger['id'], number, len(blogs), [row[0] for row in rows]),
+                _digest(blogger, rows, len(numbered)))
+
+    # each blog with its comments, streamed in blog order
+    comments = {}
+    comment_rows = Comments.objects.order_by('blog_id', *COMMENT_ORDERING).values_list(
+        'blog_id', 'id', 'comment', 'date_of_comment', 'username__username')
+    for blog_id, rows in groupby(comment_rows.iterator(chunk_size=2000),
+                                 key=lambda row: row[0]):
+        comments[blog_id] = _digest(list(rows))
+    for blog in Blog.objects.values(
+            'id', 'name', 'description', 'description_html', 'date_uploaded',
+            'blogger_id', 'blogger__first_name', 'blogger__last_name').iterator(chunk_size=2000):
+        pages[file_for(reverse('blog-detail', args=[blog['id']]))] = (
+            DETAIL, blog['id'], _digest(blog, comments.get(blog['id'])))
+    return pages
+
+
+def _anonymous_request(path):
+    # what the templates and context processors read off a GET from a visitor
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path,
+                    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    request.user = AnonymousUser()
+    return request
+
+
+def _page(model_rows, ids, number, count):
+    '''
+    A numbered page of the given rows. The rows were picked when the
+    export was planned, so this skips the OFFSET query that makes deep
+    pages slow; the paginator only needs to know the total.
+    '''
+    by_id = model_rows.in_bulk(ids)
+    paginator = Paginator(range(count), BLOGS_PER_PAGE)
+    page = Page([by_id[pk] for pk in ids if pk in by_id], number, paginator)
+    return {'page_obj': page, 'paginator': paginator, 'is_paginated': page.has_other_pages()}
+
+
+def render_page(kind, argument):
+    '''the HTML an anonymous visitor gets for one page'''
+    if kind == LIST:
+        number, count, ids = argument
+        context = _page(Blog.objects.select_related('blogger'), ids, number, count)
+        context['blogg'] = context['page_obj'].object_list
+        return render_to_string('blog/blog_list.html', context,
+                                _anonymous_request(reverse('blogs')))
+
+    if kind == BLOGGER:
+        blogger_id, number, count, ids = argument
+        context = _page(Blog.objects.all(), ids, number, count)
+        context['blogger'] = Blogger.objects.select_related('user').get(pk=blogger_id)
+        context['blog_list'] = context['page_obj'].object_list
+        url = reverse('blogs-by-blogger', args=[blogger_id])
+        return render_to_string('blog/blogs_by_blogger.html', context, _anonymous_request(url))
+
+    blog = Blog.objects.select_related('blogger').get(pk=argument)
+    comment_page = CursorPaginator(
+        live_comments(blog.pk), COMMENTS_PER_PAGE, COMMENT_ORDERING).page()
+    context = {'blogdetail': blog, 'object': blog,
+               'comments': comment_page.object_list, 'comment_page': comment_page}
+    return render_to_string('blog/blog_detail.html', context,
+                            _anonymous_request(blog.get_absolute_url()))
+
+
+def write_file(out_dir, relative_path, content):
+    '''write atomically, so a server never sees a half written page'''
+    path = os.path.join(out_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def render_batch(out_dir, batch):
+    '''render and write a list of (file, kind, argument) and return the files written'''
+    written = []
+    for relative_path, kind, argument in batch:
+        try:
+            content = render_page(kind, argument)
+        except ObjectDoesNotExist:
+            # deleted since the export was planned, the next run drops it
+            continue
+        write_file(out_dir, relative_path, content)
+        written.append(relative_path)
+    return written
+
+
+def worker_init():
+    # a no-op in forked workers, which must still not share the
+    # parent's database connections
+    django.setup()
+    connections.close_all()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'templates': None, 'pages': {}}
+
+
+def save_manifest(out_dir, manifest):
+    write_file(out_dir, MANIFEST, json.dumps(manifest, indent=1, sort_keys=True))
@@ -0,0 +1,136 @@
+'''rate limits for the views that write
+
+SQLite has a single writer, so one client posting as fast as it can
+slows down every other request. Each write view belongs to a scope with
+a rate in settings.THROTTLE_RATES, e.g.
+
+    THROTTLE_RATES = {'comment': '10/min', 'signup': '5/hour'}
+
+and every user (or IP address, for anonymous visitors) gets a token
+bucket per scope that holds that many tokens and refills at that rate.
+A request over the limit is answered with 429 and a Retry-After header
+before the view runs, so it costs no query beyond the session lookup.
+
+The bucket is kept in the cache as two keys: when it was started, and a
+counter of the tokens taken since then, which is only ever changed with
+cache.incr(). The tokens available are the ones refilled since the start
+minus the counter, so concurrent requests, in any process sharing the
+cache, can't both take the last token.
+'''
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+DEFAULT_RATES = {
+    'comment': '10/min',
+    'blogger-request': '5/hour',
+    'signup': '5/hour',
+}
+# THROTTLE_RATES that turn the throttling off, for benchmarks
+UNLIMITED = dict.fromkeys(DEFAULT_RATES)
+# a bucket is restarted this often, which also bounds how long its keys live
+BUCKET_LIFETIME = getattr(settings, 'THROTTLE_BUCKET_LIFETIME', 24 * 3600)
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600,
+           'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    '''"10/min" -> (10 tokens, refilled at 10/60 a second), None for no limit'''
+    if rate is None:
+        return None
+    count, _, period = rate.partition('/')
+    try:
+        count, seconds = int(count), PERIODS[period]
+    except (ValueError, KeyError):
+        raise ValueError(f'invalid throttle rate {rate!r}, expected e.g. "10/min"')
+    return count, count / seconds
+
+
+def rate_for(scope):
+    # read on each request so override_settings() works, None turns a scope off
+    return {**DEFAULT_RATES, **getattr(settings, 'THROTTLE_RATES', {})}.get(scope)
+
+
+def client_ident(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # the counter was evicted, or this is the bucket's first request
+        cache.add(key, 0, BUCKET_LIFETIME * 2)
+        return cache.incr(key, delta)
+
+
+def take(scope, ident, now=None):
+    '''
+    Take a token from ident's bucket for scope. Returns None when it got
+    one, or the seconds until the next token otherwise.
+    '''
+    limit = parse_rate(rate_for(scope))
+    if limit is None:
+        return None
+    capacity, refill = limit
+    now = time.time() if now is None else now
+
+    start_key = f'blog:throttle:{scope}:{ident}'
+    cache.add(start_key, now, BUCKET_LIFETIME)
+    start = cache.get(start_key, now)
+    # a restarted bucket gets a fresh counter
+    counter_key = f'{start_key}:{start}'
+
+    refilled = math.floor((now - start) * refill)
+    taken = _incr(counter_key)
+    # a full bucket doesn't collect more tokens, move the counter up to
+    # where it would be if the bucket had stopped at capacity
+    overflow = refilled - (taken - 1)
+    if overflow > 0:
+        taken = _incr(counter_key, overflow)
+    if taken <= capacity + refilled:
+        return None
+    # a refused request doesn't use up a token
+    _incr(counter_key, -1)
+    return max(1, math.ceil((taken - capacity) / refill - (now - start)))
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests, please try again later.\n',
+                            status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def throttle(scope, methods=('POST',)):
+    '''decorate a view to limit the requests it takes per client in scope'''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = take(scope, client_ident(request))
+                if retry_after is not None:
+                    return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ThrottleMixin:
+    '''throttle() for class-based views, put it first among the bases'''
+    throttle_scope = None
+    throttle_methods = ('POST',)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in self.throttle_methods:
+            retry_after = take(self.throttle_scope, client_ident(request))
+            if retry_after is not None:
+                return too_many_requests(retry_after)
+        return super().dispatch(request, *args, **kwargs)
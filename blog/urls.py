@@ -1,12 +1,14 @@
 from django.urls import path
-from . import views
+from . import api, feeds, views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('blogs/', views.BlogListView.as_view(), name='blogs'),
     path('blogs/<int:pk>', views.BlogDetailView.as_view(), name='blog-detail'),
+    path('search/', views.search_view, name='blog-search'),
     path('bloggers/', views.BloggerListView.as_view(), name='bloggers'),
     path('bloggers/<int:pk>', views.BloggerDetailView.as_view(), name='blogger-detail'),
+    path('blogs/<int:pk>/comments', views.BlogCommentsView.as_view(), name='blog-comments'),
     path('blogs/<int:pk>/comment-create', views.CommentsCreate.as_view(), name='comment-detail'),
     path('blogs/<int:pk>/comment-edit', views.CommentUpdateView.as_view(), name='comment-edit'),
     path('blogs/<int:pk>/comment-delete', views.CommentDeleteView.as_view(), name='comment-delete'),
@@ -14,9 +16,19 @@ urlpatterns = [
     path('request-to-be-blogger/', views.RequestToBeBloggerView.as_view(), name='request-to-be-blogger'),
     path('request-success/', views.request_success_view, name='request-success'),
     path('blogger-request-list/', views.blogger_request_list, name='list-of-requests'),
-    path('approved-request/', views.approve_blogger_request, name='request-approved'),
+    path('approved-request/<int:pk>', views.approve_blogger_request, name='request-approved'),
+    path('review-requests/', views.review_blogger_requests, name='review-requests'),
+    path('export/', views.export_data_view, name='export-data'),
+    path('feeds/rss/', feeds.latest_rss, name='blog-feed-rss'),
+    path('feeds/atom/', feeds.latest_atom, name='blog-feed-atom'),
+    path('feeds/blogger/<int:pk>/rss/', feeds.blogger_rss, name='blogger-feed-rss'),
+    path('feeds/blogger/<int:pk>/atom/', feeds.blogger_atom, name='blogger-feed-atom'),
+    path('api/blogs/', api.blog_list, name='api-blogs'),
+    path('api/blogs/<int:pk>/', api.blog_detail, name='api-blog'),
+    path('api/blogs/<int:pk>/comments/', api.blog_comments, name='api-blog-comments'),
+    path('api/bloggers/', api.blogger_list, name='api-bloggers'),
     path('signup/', views.SignupView.as_view(), name='signup'),
     path('create-blog/', views.CreateBlogView.as_view(), name='create-blog'),
-    path('edit-blog/', views.UpdateBlogView.as_view(), name='edit-blog'),
-    path('delete-blog/', views.DeleteBlogView.as_view(), name='delete-blog'),
+    path('edit-blog/<int:pk>', views.UpdateBlogView.as_view(), name='edit-blog'),
+    path('delete-blog/<int:pk>', views.DeleteBlogView.as_view(), name='delete-blog'),
 ]
\ No newline at end of file
@@ -1,71 +1,180 @@
 from typing import Any, Dict
 from django.db.models.query import QuerySet
 from django.forms.models import BaseModelForm
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Blog, Blogger, Comments, RequestToBeBlogger
 from django.views import generic, View
+from django.views.decorators.http import require_POST
+from django.utils.decorators import method_decorator
+from django.core.paginator import Paginator
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from .forms import BloggerRequestForm, SignupForm, BlogForm
-from django.core.mail import send_mail
-from django.contrib.auth.models import Group, User
+from .pagination import CursorPaginationMixin, CursorPaginator, HasNextPaginator
+from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
+from django.db import transaction
 from datetime import timedelta
+from . import activity, approvals, conditional, counters, datatransfer, metrics, outbox, page_cache, search, visits
+from .throttling import ThrottleMixin
 # Create your views here.
 
 
 def index(request):
     '''view for the homepage'''
 
-    # generate the amount of some objects
-    num_blogs = Blog.objects.all().count()
-    num_bloggers = Blogger.objects.all().count()
+    # read the running totals instead of counting every table
+    counts = counters.get_counts(
+        counters.BLOGS, counters.BLOGGERS, counters.COMMENTS)
 
-    # total number of comments
-    num_comments = Comments.objects.count()
-
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    # Number of visits to this view, kept in a signed cookie so that
+    # the homepage never writes to the database (see visits.py)
+    num_visits = visits.get_visits(request)
+    visits.record()
 
     context = {
-        'num_blogs': num_blogs,
-        'num_bloggers': num_bloggers,
-        'num_comments': num_comments,
+        'num_blogs': counts[counters.BLOGS],
+        'num_bloggers': counts[counters.BLOGGERS],
+        'num_comments': counts[counters.COMMENTS],
         'num_visits': num_visits,
     }
 
     # render the html template index.html
-    return render(request, 'index.html', context=context)
+    response = render(request, 'index.html', context=context)
+    visits.set_visits(request, response, num_visits + 1)
+    return response
+
+
+BLOGS_PER_PAGE = 5
+# show "page N of about M" on the numbered blog list pages, from a total
+# that is recounted in the background (see HasNextPaginator)
+APPROXIMATE_BLOG_TOTAL = getattr(settings, 'BLOG_LIST_APPROXIMATE_TOTAL', False)
+# ?sort= orderings of the blog list besides the default one
+BLOG_SORTS = {'activity': ['-last_comment_at', '-id']}
+
 
+def blog_sort(request):
+    '''the ?sort= of a blog list request if it is a known one, else None'''
+    sort = request.GET.get('sort')
+    return sort if sort in BLOG_SORTS else None
 
-class BlogListView(generic.ListView):
+
+@method_decorator(conditional.conditional(conditional.listing_validators), name='dispatch')
+class BlogListView(page_cache.VersionedPageCacheMixin, CursorPaginationMixin, generic.ListView):
     model = Blog
-    paginate_by = 5
+    paginate_by = BLOGS_PER_PAGE
+    # ?page=N links don't COUNT(*) the blogs either
+    paginator_class = HasNextPaginator
     # setting my name for the list as a template variable
     context_object_name = 'blogg'
 
     def get_queryset(self) -> QuerySet[Any]:
-        return super().get_queryset().filter(is_deleted=False)
+        # the default manager already hides deleted blogs,
+        # the template prints each blog's blogger, so join it in the same query
+        queryset = super().get_queryset().select_related('blogger')
+        sort = blog_sort(self.request)
+        if sort:
+            queryset = queryset.order_by(*BLOG_SORTS[sort])
+        return queryset
+
+    def get_paginator(self, *args, **kwargs):
+        return super().get_paginator(*args, approximate=APPROXIMATE_BLOG_TOTAL, **kwargs)
+
+    def get_cursor_ordering(self):
+        sort = blog_sort(self.request)
+        if sort:
+            return BLOG_SORTS[sort]
+        return super().get_cursor_ordering()
+
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        # kept in the pagination links
+        context['sort'] = blog_sort(self.request)
+        return context
+
+
+# how comments are ordered, oldest first with id breaking ties
+COMMENT_ORDERING = ['date_of_comment', 'id']
+COMMENTS_PER_PAGE = 20
+
 
+def live_comments(blog_id):
+    '''the comments of a blog that haven't been deleted, with their authors'''
+    return Comments.objects.filter(blog_id=blog_id).select_related('username')
 
+
+# on get rather than dispatch, so that the login check comes first
+@method_decorator(conditional.conditional(conditional.blog_validators), name='get')
 class BlogDetailView(LoginRequiredMixin, generic.DetailView):
     model = Blog
     # setting my name for the list as a template variable
     context_object_name = 'blogdetail'
 
-    # this shows only the comments whose is_deleted field is False
+    def get_queryset(self) -> QuerySet[Any]:
+        return super().get_queryset().select_related('blogger')
+
+    # this shows only the first page of comments whose deleted field is False,
+    # the rest are loaded from BlogCommentsView
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        blog = self.get_object()
-        context['comments'] = blog.comments_set.filter(deleted=False)
+        paginator = CursorPaginator(
+            live_comments(self.object.pk), COMMENTS_PER_PAGE, COMMENT_ORDERING)
+        page = paginator.page()
+        context['comments'] = page.object_list
+        context['comment_page'] = page
         return context
 
 
+class BlogCommentsView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
+    '''the "load more" stream of a blog's comments'''
+    model = Comments
+    paginate_by = COMMENTS_PER_PAGE
+    cursor_ordering = COMMENT_ORDERING
+    context_object_name = 'comments'
+    template_name = 'blog/blog_comments.html'
+
+    def get_queryset(self) -> QuerySet[Any]:
+        self.blog = get_object_or_404(Blog, pk=self.kwargs['pk'])
+        return live_comments(self.blog.pk)
+
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['blog'] = self.blog
+        context['comment_page'] = context['page_obj']
+        return context
+
+
+SEARCH_RESULTS_PER_PAGE = 10
+
+
+def search_view(request):
+    '''ranked full-text search over blog titles and bodies'''
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    # fetch one extra row to find out if there is a next page
+    # without counting every match
+    offset = (page - 1) * SEARCH_RESULTS_PER_PAGE
+    results = search.search(query, offset, SEARCH_RESULTS_PER_PAGE + 1)
+
+    context = {
+        'query': query,
+        'results': results[:SEARCH_RESULTS_PER_PAGE],
+        'page': page,
+        'has_next': len(results) > SEARCH_RESULTS_PER_PAGE,
+        'has_previous': page > 1,
+    }
+    return render(request, 'blog/search.html', context=context)
+
+
 class BloggerListView(LoginRequiredMixin, generic.ListView):
     model = Blogger
     paginate_by = 5
@@ -74,28 +183,35 @@ class BloggerListView(LoginRequiredMixin, generic.ListView):
 class BloggerDetailView(LoginRequiredMixin, generic.DetailView):
     model = Blogger
 
-class Bloggers_BlogsView(generic.ListView):
+@method_decorator(conditional.conditional(conditional.blogger_validators), name='dispatch')
+class Bloggers_BlogsView(page_cache.VersionedPageCacheMixin, CursorPaginationMixin, generic.ListView):
     model = Blog
-    paginate_by = 5
+    paginate_by = BLOGS_PER_PAGE
+    paginator_class = HasNextPaginator
     template_name = 'blog/blogs_by_blogger.html'
 
+    def get_cache_versions(self):
+        return [page_cache.blogger_version(self.kwargs['pk'])]
+
     def get_queryset(self) -> QuerySet[Any]:
         id = self.kwargs['pk']
         
         # get the original blogger via the pk
-        # and assign it to a variable
-        original_author = get_object_or_404(Blogger, pk=id)
+        # and keep it for get_context_data so it is only fetched once
+        self.blogger = get_object_or_404(
+            Blogger.objects.select_related('user'), pk=id)
 
         # return the blogs written by the specific blogger
-        # that hasn't been deleted
-        return Blog.objects.filter(blogger=original_author, is_deleted=False)
+        # that hasn't been deleted (the default manager skips those)
+        return Blog.objects.filter(blogger=self.blogger)
     
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        context['blogger'] = get_object_or_404(Blogger, pk=self.kwargs['pk'])
+        context['blogger'] = self.blogger
         return context
 
-class CommentsCreate(LoginRequiredMixin, CreateView):
+class CommentsCreate(ThrottleMixin, LoginRequiredMixin, CreateView):
+    throttle_scope = 'comment'
     model = Comments
     fields = ['comment',]
     template_name = 'blog/create_comment.html'
@@ -118,14 +234,18 @@ class CommentsCreate(LoginRequiredMixin, CreateView):
         form.instance.username = self.request.user
         # Associate the comment with the specific blog based on pk
         form.instance.blog = get_object_or_404(Blog, pk=self.kwargs['pk'])
-        # Call super-class form validation behaviour
-        return super(CommentsCreate, self).form_valid(form)
+        with transaction.atomic():
+            # Call super-class form validation behaviour
+            response = super(CommentsCreate, self).form_valid(form)
+            activity.comment_added(self.object)
+        return response
 
     def get_success_url(self):
         '''after posting the comment, return to the associated blog'''
         return reverse('blog-detail', kwargs={'pk': self.kwargs['pk'],})
 
-class CommentUpdateView(UpdateView):
+class CommentUpdateView(ThrottleMixin, UpdateView):
+    throttle_scope = 'comment'
     model = Comments
     fields = ['comment',]
     template_name = 'blog/update_comment.html'
@@ -152,21 +272,24 @@ class CommentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     success_url = reverse_lazy('blogs')
 
     def test_func(self):
+        # the comment's author or the blog's blogger may delete it
         comment = self.get_object()
-        return comment.author == self.request.user or comment.blog.author == self.request.user
+        blogger = comment.blog.blogger
+        return comment.username == self.request.user or (
+            blogger is not None and blogger.user == self.request.user)
 
     def form_valid(self, form):
-        comment = self.get_object()
-        comment.deleted = True
-        comment.save()
+        self.get_object().soft_delete()
         return HttpResponseRedirect(self.get_success_url())
 
-class RequestToBeBloggerView(LoginRequiredMixin, View):
+class RequestToBeBloggerView(ThrottleMixin, LoginRequiredMixin, View):
     '''handles the author request form,
     checks if a request already exists for the user,
     sends email notifications to editors,
     and saves the request to the database.'''
     
+    throttle_scope = 'blogger-request'
+
     # specifies the form to use for the view
     form_class = BloggerRequestForm
 
@@ -201,29 +324,31 @@ class RequestToBeBloggerView(LoginRequiredMixin, View):
                     message = 'Your author request already exists and is pending.'
                 return render(request, self.template_name, {'form': form, 'message': message})
 
-            # if it is a new request,
-            # save the form explicitly
-            author_request = form.save(commit=False)
-
-            # assigning the user attribute of the author_request
-            # object with the currently logged-in user (request.user).
-            author_request.user = request.user
-            author_request.save()
-
-            # a variable that holds the group object representing a group named "Editors".
-            editors_group = Group.objects.get(name='Editors')
-
-            # retrieve all the users who belong to the 'Editors' group
-            editors = editors_group.user_set.all()
-            for editor in editors:
-                editor_email = editor.email
-                send_mail(
-                    "New Author Request",
-                    f"{request.user} has requested to become an Author",
-                    settings.EMAIL_HOST_USER,
-                    [editor_email]
+            with transaction.atomic():
+                # if it is a new request,
+                # save the form explicitly
+                author_request = form.save(commit=False)
+
+                # assigning the user attribute of the author_request
+                # object with the currently logged-in user (request.user).
+                author_request.user = request.user
+                author_request.request_date = timezone.now()
+                author_request.save()
+
+                # retrieve the emails of all the users who belong to the 'Editors' group
+                editor_emails = User.objects.filter(
+                    groups__name='Editors').values_list('email', flat=True)
+
+                # queue one email per editor, the send_outbox worker
+                # delivers them after this transaction commits
+                outbox.enqueue_many(
+                    ("New Author Request",
+                     f"{request.user} has requested to become an Author",
+                     settings.EMAIL_HOST_USER,
+                     [editor_email])
+                    for editor_email in editor_emails
                 )
-            return redirect('request_success')  # Redirect to a success page
+            return redirect('request-success')  # Redirect to a success page
 
         return render(request, self.template_name, {'form': form})
     
@@ -231,33 +356,65 @@ def request_success_view(request):
     return render(request, 'blog/request_success.html')
 
 
+BLOGGER_REQUESTS_PER_PAGE = 25
+
+
+@permission_required('blog.can_approve_request')
 def blogger_request_list(request):
-    blogger_requests = RequestToBeBlogger.objects.filter(status='P')  # Get pending requests from users
-    return render(request, 'blog/blogger_request_list.html', {'blogger_requests': blogger_requests})
+    # Get pending requests from users, a page at a time,
+    # with their users joined for the template
+    blogger_requests = RequestToBeBlogger.objects.filter(
+        status='P').select_related('user')
+    paginator = Paginator(blogger_requests, BLOGGER_REQUESTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    context = {
+        'blogger_requests': page.object_list,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+    }
+    return render(request, 'blog/blogger_request_list.html', context)
+
 
+@permission_required('blog.can_approve_request')
 def approve_blogger_request(request, pk):
-    blogger_request = get_object_or_404(RequestToBeBlogger, pk=pk)
-    blogger_request.status = 'A'
-    blogger_request.save()
-    send_mail(
-        "Blogger Request Acceted",
-        f"CONGRATULATIONS {blogger_request.first_name} {blogger_request.last_name}, Your Request to become an author has been approved. Happy writing",
-        settings.EMAIL_HOST_USER,
-        [blogger_request.user.email]
-    )
-    # Create a new Author instance based on the approved request
-    if blogger_request.status == 'A':
-        Blogger.objects.create(
-            user=blogger_request.user,
-            first_name=blogger_request.first_name,
-            last_name=blogger_request.last_name,
-            bio=blogger_request.bio
-        )
-
-    return redirect('author_request_list')
-
-
-class SignupView(CreateView):
+    get_object_or_404(RequestToBeBlogger, pk=pk)
+    approvals.approve_requests([pk])
+    return redirect('list-of-requests')
+
+
+@require_POST
+@permission_required('blog.can_approve_request')
+def review_blogger_requests(request):
+    '''approve or reject every selected request in one go'''
+    request_ids = [pk for pk in request.POST.getlist('request_ids') if pk.isdigit()]
+    action = request.POST.get('action')
+    if action == 'approve':
+        approvals.approve_requests(request_ids)
+    elif action == 'reject':
+        approvals.reject_requests(request_ids)
+    return redirect('list-of-requests')
+
+
+def metrics_view(request):
+    '''request timing histograms in the Prometheus text format, for staff only'''
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(metrics.export(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def export_data_view(request):
+    '''the export_blog_data dump, streamed as it is read, for staff only'''
+    if not request.user.is_staff:
+        raise PermissionDenied
+    response = StreamingHttpResponse(datatransfer.export_lines(),
+                                     content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="blog-data.jsonl"'
+    return response
+
+
+class SignupView(ThrottleMixin, CreateView):
+    throttle_scope = 'signup'
     model = User
     form_class = SignupForm
     template_name = 'blog/signup.html'
@@ -276,7 +433,7 @@ class CreateBlogView(LoginRequiredMixin, CreateView):
 
 class UpdateBlogView(LoginRequiredMixin, UpdateView):
     model = Blog
-    fields = ['name', 'description']
+    form_class = BlogForm
     template_name = 'blog/edit_blog.html'
     def dispatch(self, request, *args, **kwargs):
         obj = self.get_object()
@@ -290,8 +447,10 @@ class DeleteBlogView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy('blogs')
     template_name = 'blog/blog_confirm_delete.html'
 
+    def get_queryset(self) -> QuerySet[Any]:
+        # only the blogger who wrote a blog may delete it, anyone else gets a 404
+        return Blog.objects.filter(blogger__user=self.request.user)
+
     def form_valid(self, form) -> HttpResponse:
-        blog = self.get_object()
-        blog.is_deleted = True
-        blog.save()
+        self.get_object().soft_delete()
         return HttpResponseRedirect(self.get_success_url())
\ No newline at end of file
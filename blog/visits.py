@@ -0,0 +1,143 @@
+'''visit counting that keeps the homepage read-only for the database
+
+Two things are counted:
+
+* how often each visitor has seen a page, shown back to them on the
+  homepage. By default this lives in a signed cookie, so nothing is
+  written server-side. VISIT_TRACKING = 'session' keeps it in the
+  session instead; pair that with the signed_cookies or cache session
+  engine, or every hit becomes a django_session UPDATE again.
+* how many hits each page got in total. Hits are added to a buffer in
+  this process and written to SiteCounter in one UPDATE per page, once
+  VISIT_FLUSH_THRESHOLD hits have piled up or VISIT_FLUSH_INTERVAL
+  seconds have passed, and once more when the process exits. A crash
+  loses at most one unflushed buffer.
+'''
+import atexit
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+
+from .models import SiteCounter
+
+HOMEPAGE = 'index'
+COOKIE_NAME = 'blog_visits'
+COOKIE_SALT = 'blog.visits'
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+
+
+def counter_name(page):
+    return f'visits:{page}'
+
+
+def get_visits(request, page=HOMEPAGE):
+    '''how many times this visitor has seen the page before'''
+    if getattr(settings, 'VISIT_TRACKING', 'cookie') == 'session':
+        return request.session.get('num_visits', 0)
+    try:
+        value = request.get_signed_cookie(
+            f'{COOKIE_NAME}_{page}', default=0, salt=COOKIE_SALT)
+        return max(int(value), 0)
+    except (ValueError, signing.BadSignature):
+        return 0
+
+
+async def aget_visits(request, page=HOMEPAGE):
+    if getattr(settings, 'VISIT_TRACKING', 'cookie') == 'session':
+        # loading the session is a database read
+        return await sync_to_async(get_visits)(request, page)
+    return get_visits(request, page)
+
+
+def set_visits(request, response, value, page=HOMEPAGE):
+    if getattr(settings, 'VISIT_TRACKING', 'cookie') == 'session':
+        request.session['num_visits'] = value
+    else:
+        response.set_signed_cookie(
+            f'{COOKIE_NAME}_{page}', value, salt=COOKIE_SALT,
+            max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+
+
+def _add(page):
+    '''count one hit in the process buffer and say whether a flush is due'''
+    global _last_flush
+    threshold = getattr(settings, 'VISIT_FLUSH_THRESHOLD', 1000)
+    interval = getattr(settings, 'VISIT_FLUSH_INTERVAL', 10)
+    with _lock:
+        _pending[page] += 1
+        due = (sum(_pending.values()) >= threshold
+               or time.monotonic() - _last_flush >= interval)
+        if due:
+            _last_flush = time.monotonic()
+    return due
+
+
+def record(page=HOMEPAGE):
+    '''count one hit, flushing the buffer when it is due'''
+    if _add(page):
+        flush()
+
+
+async def arecord(page=HOMEPAGE):
+    if _add(page):
+        await sync_to_async(flush)()
+
+
+def pending():
+    with _lock:
+        return dict(_pending)
+
+
+def flush():
+    '''write the buffered hits to the database and empty the buffer'''
+    with _lock:
+        hits = dict(_pending)
+        _pending.clear()
+    if not hits:
+        return
+    try:
+        with transaction.atomic():
+            for page, count in hits.items():
+                name = counter_name(page)
+                updated = SiteCounter.objects.filter(name=name).update(
+                    value=F('value') + count)
+                if not updated:
+                    SiteCounter.objects.create(name=name, value=count)
+    except Exception:
+        # keep the hits for the next attempt rather than dropping them
+        with _lock:
+            _pending.update(hits)
+        raise
+
+
+def reset():
+    '''drop the buffered hits without writing them'''
+    with _lock:
+        _pending.clear()
+
+
+def total(page=HOMEPAGE):
+    '''the stored total plus whatever this process has not flushed yet'''
+    stored = SiteCounter.objects.filter(
+        name=counter_name(page)).values_list('value', flat=True).first()
+    return (stored or 0) + pending().get(page, 0)
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)